@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (
+    absolute_import,
+    division,
+    print_function,
+    unicode_literals,
+)
+
+import time
+
+import pytest
+
+from yodapy.datasources.ooi.cloud import CloudCatalog, fetch_zarr
+
+
+STREAM_KEY = "RS03AXPS-PC03A-4A-CTDPFA303-streamed-ctdpf_optode_sample"
+
+
+@pytest.mark.benchmark
+def test_cloud_listing_latency(s3_bucket, yodapy_dir):
+    s3_bucket.add_stream(STREAM_KEY, partitions=16)
+    s3_bucket.fs.latency = 0.05
+    catalog = CloudCatalog(fs=s3_bucket.fs, bucket=s3_bucket.bucket)
+
+    start = time.perf_counter()
+    catalog.streams(refresh=True)
+    catalog.partitions(STREAM_KEY, refresh=True)
+    cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(10):
+        catalog.streams()
+        catalog.select(STREAM_KEY, "2018-01-01T05:00", "2018-01-01T09:00")
+    warm = (time.perf_counter() - start) / 10
+
+    print(f"\nlisting cold: {cold * 1000:.1f}ms, warm: {warm * 1000:.2f}ms")
+    assert warm < cold / 10
+
+
+@pytest.mark.benchmark
+def test_fetch_zarr_latency(s3_bucket, yodapy_dir):
+    s3_bucket.add_stream(STREAM_KEY, partitions=16)
+    s3_bucket.fs.latency = 0.01
+    catalog = CloudCatalog(fs=s3_bucket.fs, bucket=s3_bucket.bucket)
+    catalog.partitions(STREAM_KEY, refresh=True)
+
+    print("\npartitions  workers  open+combine  slice+load")
+    timings = {}
+    for partitions in [4, 16]:
+        uris = catalog.select(STREAM_KEY).uri.tolist()[:partitions]
+        for workers in [1, 16]:
+            start = time.perf_counter()
+            ds = fetch_zarr(uris, fs=s3_bucket.fs, max_workers=workers)
+            opened = time.perf_counter() - start
+            assert ds.sizes["time"] == partitions * 1000
+
+            start = time.perf_counter()
+            ds.sel(time=slice("2018-01-01T01:00", "2018-01-01T02:00")).load()
+            sliced = time.perf_counter() - start
+
+            timings[partitions, workers] = opened
+            print(
+                f"{partitions:>10}  {workers:>7}  {opened * 1000:>10.0f}ms"
+                f"  {sliced * 1000:>8.0f}ms"
+            )
+
+    assert timings[16, 16] < timings[16, 1] / 2
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (
+    absolute_import,
+    division,
+    print_function,
+    unicode_literals,
+)
+
+import os
+import time
+
+import pytest
+import requests
+
+from yodapy.utils import conn
+
+
+def legacy_write(r, path):
+    """ Previous 1 KiB iter_content writer """
+    with open(path, "wb") as f:
+        for chunk in r.iter_content(chunk_size=1024):
+            if chunk:
+                f.write(chunk)
+
+
+def timed_download(url, path, writer):
+    start = time.perf_counter()
+    r = requests.get(url, stream=True)
+    writer(r, path)
+    return time.perf_counter() - start
+
+
+@pytest.mark.benchmark
+def test_write_stream_throughput(http_server, netcdf_bytes, tmpdir):
+    http_server.files["data.nc"] = netcdf_bytes
+    url = f"{http_server.url}/data.nc"
+    size_mb = len(netcdf_bytes) / 1024 ** 2
+
+    legacy_path = str(tmpdir.join("legacy.nc"))
+    stream_path = str(tmpdir.join("stream.nc"))
+    legacy_time = timed_download(url, legacy_path, legacy_write)
+    stream_time = timed_download(url, stream_path, conn.write_stream)
+
+    print(
+        f"\n1 KiB iter_content: {size_mb / legacy_time:.1f} MB/s"
+        f"\nwrite_stream ({conn.DOWNLOAD_BUFFER_SIZE // 1024 ** 2} MiB): "
+        f"{size_mb / stream_time:.1f} MB/s"
+    )
+
+    with open(stream_path, "rb") as f:
+        assert f.read() == netcdf_bytes
+    assert not os.path.exists(f"{stream_path}.part")
+    assert stream_time < legacy_time
+
+
+@pytest.mark.benchmark
+def test_segmented_download(http_server, netcdf_bytes, tmpdir):
+    http_server.files["data.nc"] = netcdf_bytes
+    http_server.rate_limit = 64 * 1024 * 1024
+    url = f"{http_server.url}/data.nc"
+    size_mb = len(netcdf_bytes) / 1024 ** 2
+    session = requests.Session()
+
+    timings = {}
+    for segments in [1, 4]:
+        folder = tmpdir.mkdir(f"segments{segments}")
+        start = time.perf_counter()
+        fname = conn.download_url(url, str(folder), session, segments=segments)
+        timings[segments] = time.perf_counter() - start
+        with open(str(folder.join(fname)), "rb") as f:
+            assert f.read() == netcdf_bytes
+
+    print(
+        "".join(
+            f"\n{n} segment(s): {size_mb / t:.1f} MB/s"
+            for n, t in timings.items()
+        )
+    )
+    assert timings[4] < timings[1]
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (
+    absolute_import,
+    division,
+    print_function,
+    unicode_literals,
+)
+
+import os
+import time
+
+import pytest
+import requests
+
+from yodapy.utils import conn
+
+
+@pytest.mark.benchmark
+def test_run_concurrently_speedup(http_server, tmpdir):
+    nfiles = 8
+    http_server.latency = 0.25
+    for i in range(nfiles):
+        http_server.files[f"data{i}.nc"] = b"CDF\x01" + os.urandom(1024)
+    urls = [f"{http_server.url}/data{i}.nc" for i in range(nfiles)]
+    session = requests.Session()
+
+    timings = {}
+    for workers in [1, nfiles]:
+        folder = str(tmpdir.mkdir(f"workers{workers}"))
+        start = time.perf_counter()
+        fnames = conn.run_concurrently(
+            conn.download_url,
+            [(url, folder, session) for url in urls],
+            max_workers=workers,
+        )
+        timings[workers] = time.perf_counter() - start
+        assert fnames == [os.path.basename(url) for url in urls]
+
+    speedup = timings[1] / timings[nfiles]
+    print(
+        f"\n1 worker: {timings[1]:.2f}s, {nfiles} workers: "
+        f"{timings[nfiles]:.2f}s ({speedup:.1f}x)"
+    )
+    assert speedup > nfiles / 2
+
+
+def fake_processed_ek60(temp_file, clean_up=True, params=None, in_memory=True):
+    """ CPU bound stand-in for echopype processing """
+    deadline = time.process_time() + 0.5
+    while time.process_time() < deadline:
+        pass
+    mvbs = temp_file.replace(".raw", "_MVBS.nc")
+    if os.path.exists(temp_file):
+        with open(mvbs, "w") as f:
+            f.write(str(params))
+    return mvbs
+
+
+@pytest.mark.benchmark
+@pytest.mark.skipif(os.cpu_count() < 4, reason="Needs at least 4 cores")
+def test_ek60_processing_speedup(monkeypatch):
+    monkeypatch.setattr(conn, "get_processed_ek60", fake_processed_ek60)
+    raw_file_dict = {"CE02SHBP-MJ01C": [f"{i}.raw" for i in range(8)]}
+
+    timings = {}
+    for workers in [1, 4]:
+        start = time.perf_counter()
+        conn.perform_ek60_processing(raw_file_dict, max_workers=workers)
+        timings[workers] = time.perf_counter() - start
+
+    speedup = timings[1] / timings[4]
+    print(f"\n1 process: {timings[1]:.2f}s, 4 processes: {timings[4]:.2f}s")
+    assert speedup > 2
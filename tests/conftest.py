@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (
+    absolute_import,
+    division,
+    print_function,
+    unicode_literals,
+)
+
+import functools
+import os
+import re
+import threading
+import time
+import uuid
+
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from fsspec.implementations.memory import MemoryFileSystem
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--run-benchmarks",
+        action="store_true",
+        default=False,
+        help="run the timing benchmarks marked with benchmark",
+    )
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "benchmark: timing benchmark, run with --run-benchmarks"
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--run-benchmarks"):
+        return
+    skip = pytest.mark.skip(reason="timing benchmark, use --run-benchmarks")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
+
+
+class LocalFileHandler(BaseHTTPRequestHandler):
+    """ Serves ``server.files`` with HTTP Range support """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self):
+        self.server.requests.append(
+            (self.command, self.path, self.headers.get("Range"))
+        )
+        data = self.server.files.get(self.path.lstrip("/"))
+        if data is None:
+            self.send_error(404)
+            return None
+
+        time.sleep(self.server.latency)
+        rng = self.headers.get("Range")
+        if rng and self.server.accept_ranges:
+            start, end = re.match(r"bytes=(\d+)-(\d*)", rng).groups()
+            start = int(start)
+            end = int(end) if end else len(data) - 1
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", f"bytes {start}-{end}/{len(data)}"
+            )
+            body = data[start : end + 1]
+        else:
+            self.send_response(200)
+            body = data
+        if self.server.accept_ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        return body
+
+    def do_HEAD(self):
+        self._body()
+
+    def do_GET(self):
+        body = self._body()
+        if body is None:
+            return
+        if not self.server.rate_limit:
+            self.wfile.write(body)
+            return
+        # Emulate per-connection throughput of a remote server
+        chunk_size = 1024 * 1024
+        for start in range(0, len(body), chunk_size):
+            self.wfile.write(body[start : start + chunk_size])
+            time.sleep(chunk_size / self.server.rate_limit)
+
+
+class ConcurrencyCounter:
+    """ Peak number of calls of the wrapped functions running at once """
+
+    def __init__(self):
+        self.running = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def wrap(self, func, barrier=None):
+        """
+        Count the calls of func. With ``barrier``, calls wait until that
+        many of them run at the same time.
+        """
+        barrier = threading.Barrier(barrier, timeout=10) if barrier else None
+
+        @functools.wraps(func)
+        def counted(*args, **kwargs):
+            with self._lock:
+                self.running += 1
+                self.peak = max(self.peak, self.running)
+            try:
+                if barrier:
+                    barrier.wait()
+                return func(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.running -= 1
+
+        return counted
+
+
+class LatencyFileSystem(MemoryFileSystem):
+    """ In-memory stand-in for the S3 bucket, with a latency per request """
+
+    def __init__(self, latency=0, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def _request(self, kind):
+        with self._lock:
+            self.calls[kind] += 1
+        time.sleep(self.latency)
+
+    def ls(self, path, detail=True, **kwargs):
+        self._request("ls")
+        return super().ls(path, detail=detail)
+
+    def info(self, path, **kwargs):
+        self._request("info")
+        return super().info(path, **kwargs)
+
+    def cat_file(self, path, start=None, end=None, **kwargs):
+        self._request("cat")
+        return super().cat_file(path, start=start, end=end, **kwargs)
+
+
+class S3Bucket:
+    """ Synthetic OOI cloud bucket with zarr partitions """
+
+    def __init__(self, fs, bucket):
+        self.fs = fs
+        self.bucket = bucket
+
+    def add_stream(self, stream_key, partitions=4, rows=1000, freq="1min"):
+        """ Write a stream of consecutive partitions, named by their start time """
+        start = pd.Timestamp("2018-01-01")
+        for _ in range(partitions):
+            times = pd.date_range(start, periods=rows, freq=freq)
+            ds = xr.Dataset(
+                {
+                    "seawater_temperature": ("time", np.random.rand(rows)),
+                    "seawater_pressure": ("time", np.random.rand(rows)),
+                },
+                coords={"time": times},
+            ).chunk({"time": rows // 4 or 1})
+            uri = f"{self.bucket}/{stream_key}/{times[0]:%Y-%m-%dT%H:%M:%S}"
+            ds.to_zarr(self.fs.get_mapper(uri), mode="w", consolidated=True)
+            start = times[-1] + pd.Timedelta(freq)
+        return start
+
+
+@pytest.fixture
+def s3_bucket():
+    """ In-memory bucket, set ``s3_bucket.fs.latency`` to emulate S3 """
+    fs = LatencyFileSystem(skip_instance_cache=True)
+    bucket = S3Bucket(fs, f"/io2data-{uuid.uuid4().hex}/data")
+    yield bucket
+    fs.latency = 0
+    fs.rm(bucket.bucket.rsplit("/", 1)[0], recursive=True)
+
+
+@pytest.fixture
+def concurrency():
+    """ Count concurrent calls, see ``ConcurrencyCounter`` """
+    return ConcurrencyCounter()
+
+
+@pytest.fixture
+def yodapy_dir(tmp_path, monkeypatch):
+    """ Keep the caches of the data sources out of the user ``~/.yodapy`` """
+    monkeypatch.setattr("yodapy.utils.meta.YODAPY_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def http_server():
+    """
+    Local HTTP server, files are added to ``http_server.files`` and the
+    method, path and Range of each request are kept in ``http_server.requests``
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), LocalFileHandler)
+    server.daemon_threads = True
+    server.files = {}
+    server.requests = []
+    server.latency = 0
+    server.accept_ranges = True
+    server.rate_limit = None
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def netcdf_bytes():
+    """ 64 MiB of random bytes with a netcdf signature """
+    return b"CDF\x01" + os.urandom(64 * 1024 * 1024 - 4)
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (
+    absolute_import,
+    division,
+    print_function,
+    unicode_literals,
+)
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from yodapy.datasources.ooi import cloud
+from yodapy.datasources.ooi.cloud import (
+    ChunkCache,
+    CloudCatalog,
+    fetch_zarr,
+    open_partition,
+)
+
+
+STREAM_KEY = "RS03AXPS-PC03A-4A-CTDPFA303-streamed-ctdpf_optode_sample"
+
+
+def test_cloud_catalog(s3_bucket, yodapy_dir):
+    fs, bucket = s3_bucket.fs, s3_bucket.bucket
+    for partition in ["2018-03-01", "2018-01-01", "2018-02-01"]:
+        fs.pipe(f"{bucket}/{STREAM_KEY}/{partition}/.zmetadata", b"{}")
+    fs.pipe(f"{bucket}/{STREAM_KEY}/.zmetadata", b"{}")
+
+    catalog = CloudCatalog(fs=fs, bucket=bucket)
+
+    assert catalog.streams() == [STREAM_KEY]
+    assert [str(t.date()) for t in catalog.partitions(STREAM_KEY).index] == [
+        "2018-01-01",
+        "2018-02-01",
+        "2018-03-01",
+    ]
+    selected = catalog.select(STREAM_KEY, "2018-01-15", "2018-02-15T00:00:00Z")
+    assert [uri.split("/")[-1] for uri in selected.uri] == [
+        "2018-01-01",
+        "2018-02-01",
+    ]
+
+    # Listings are cached until refreshed
+    fs.pipe(f"{bucket}/{STREAM_KEY}/2018-04-01/.zmetadata", b"{}")
+    cached = CloudCatalog(fs=fs, bucket=bucket)
+    assert len(cached.partitions(STREAM_KEY)) == 3
+    assert len(catalog.partitions(STREAM_KEY, refresh=True)) == 4
+
+    # Each bucket has its own listing
+    other_bucket = f"{bucket}-other"
+    fs.pipe(f"{other_bucket}/other-stream/2018-01-01/.zmetadata", b"{}")
+    other = CloudCatalog(fs=fs, bucket=other_bucket)
+    assert other.streams() == ["other-stream"]
+    assert catalog.streams() == [STREAM_KEY]
+
+
+def test_cloud_listing_cached(s3_bucket, yodapy_dir):
+    s3_bucket.add_stream(STREAM_KEY, partitions=16)
+    catalog = CloudCatalog(fs=s3_bucket.fs, bucket=s3_bucket.bucket)
+
+    assert catalog.streams(refresh=True) == [STREAM_KEY]
+    assert len(catalog.partitions(STREAM_KEY, refresh=True)) == 16
+
+    listings = s3_bucket.fs.calls["ls"]
+    for _ in range(10):
+        catalog.streams()
+        catalog.select(STREAM_KEY, "2018-01-01T05:00", "2018-01-01T09:00")
+    assert s3_bucket.fs.calls["ls"] == listings
+
+    # The listing is saved, a new catalog does not list the bucket
+    cached = CloudCatalog(fs=s3_bucket.fs, bucket=s3_bucket.bucket)
+    assert len(cached.select(STREAM_KEY)) == 16
+    assert s3_bucket.fs.calls["ls"] == listings
+
+
+def test_fetch_zarr(s3_bucket):
+    fs = s3_bucket.fs
+    uris = []
+    for month in [1, 2, 3]:
+        times = pd.date_range(f"2018-{month:02d}-01", periods=10, freq="D")
+        ds = xr.Dataset(
+            {
+                "seawater_temperature": ("time", np.arange(10.0) + month),
+                "conductivity": ("time", np.zeros(10)),
+            },
+            coords={"time": times},
+        )
+        uri = f"{s3_bucket.bucket}/{STREAM_KEY}/{times[0]:%Y-%m-%d}"
+        ds.to_zarr(fs.get_mapper(uri), mode="w", consolidated=True)
+        uris.append(uri)
+
+    ds = fetch_zarr(
+        uris,
+        variables=["seawater_temperature"],
+        fs=fs,
+        begin_date="2018-01-05",
+        end_date="2018-02-03",
+    )
+    assert list(ds.data_vars) == ["seawater_temperature"]
+    assert ds.sizes["time"] == 9
+    assert ds.indexes["time"].is_monotonic_increasing
+    assert fetch_zarr(uris, fs=fs, begin_date="2019-01-01") is None
+
+
+def test_fetch_zarr_concurrency(s3_bucket, concurrency, monkeypatch):
+    s3_bucket.add_stream(STREAM_KEY, partitions=8, rows=10)
+    s3_bucket.fs.latency = 0.02
+    uris = sorted(
+        s3_bucket.fs.ls(f"{s3_bucket.bucket}/{STREAM_KEY}", detail=False)
+    )
+    monkeypatch.setattr(
+        cloud, "open_partition", concurrency.wrap(open_partition)
+    )
+    ds = fetch_zarr(uris, fs=s3_bucket.fs, max_workers=4)
+
+    assert ds.sizes["time"] == 80
+    # Partitions are opened concurrently, at most max_workers at a time
+    assert 1 < concurrency.peak <= 4
+
+
+def test_fetch_zarr_window_reads(s3_bucket, yodapy_dir):
+    s3_bucket.add_stream(STREAM_KEY, partitions=16)
+    catalog = CloudCatalog(fs=s3_bucket.fs, bucket=s3_bucket.bucket)
+    catalog.partitions(STREAM_KEY, refresh=True)
+
+    def chunk_reads(begin_date=None, end_date=None):
+        uris = catalog.select(STREAM_KEY, begin_date, end_date).uri.tolist()
+        before = s3_bucket.fs.calls["cat"]
+        fetch_zarr(
+            uris, fs=s3_bucket.fs, begin_date=begin_date, end_date=end_date
+        ).load()
+        return len(uris), s3_bucket.fs.calls["cat"] - before
+
+    full_partitions, full_reads = chunk_reads()
+    window_partitions, window_reads = chunk_reads(
+        "2018-01-01T17:00", "2018-01-01T18:00"
+    )
+
+    assert window_partitions == 1
+    assert window_reads < full_reads / 8
+
+
+def test_chunk_cache(s3_bucket, yodapy_dir):
+    fs = s3_bucket.fs
+    times = pd.date_range("2018-01-01", periods=100, freq="h")
+    uri = f"{s3_bucket.bucket}/{STREAM_KEY}/2018-01-01"
+    xr.Dataset(
+        {"seawater_temperature": ("time", np.arange(100.0))},
+        coords={"time": times},
+    ).chunk({"time": 10}).to_zarr(fs.get_mapper(uri), mode="w")
+
+    cache = ChunkCache(fs=fs)
+    cold = fetch_zarr([uri], fs=cache.fs).seawater_temperature.sum()
+    assert float(cold) == 4950.0
+    cold_info = cache.cache_info()
+    # Time and temperature chunks, zarr metadata is not cached
+    assert cold_info["misses"] == cold_info["files"] == 11
+
+    warm_cache = ChunkCache(fs=fs)
+    warm = fetch_zarr([uri], fs=warm_cache.fs).seawater_temperature.sum()
+    assert float(warm) == 4950.0
+    warm_info = warm_cache.cache_info()
+    assert warm_info["hits"] >= 11
+    assert warm_info["misses"] == 0
+
+    # Appended partitions are read through fresh metadata
+    new_times = pd.date_range("2018-01-05 04:00", periods=10, freq="h")
+    xr.Dataset(
+        {"seawater_temperature": ("time", np.arange(100.0, 110.0))},
+        coords={"time": new_times},
+    ).chunk({"time": 10}).to_zarr(fs.get_mapper(uri), append_dim="time")
+    appended = fetch_zarr([uri], fs=warm_cache.fs).seawater_temperature
+    assert appended.sizes["time"] == 110
+    assert float(appended.sum()) == 4950.0 + 1045.0
+    # Only the changed and new chunks are read from the bucket
+    assert 11 < warm_cache.cache_info()["misses"] < 22
+
+    # Expired chunks are read from the bucket again
+    expired_cache = ChunkCache(fs=fs, ttl=0)
+    fetch_zarr([uri], fs=expired_cache.fs).seawater_temperature.load()
+    assert expired_cache.cache_info()["hits"] == 0
+
+    warm_cache.max_bytes = warm_cache.size // 2
+    warm_cache.evict()
+    assert warm_cache.size <= warm_cache.max_bytes
+    assert warm_cache.cache_info()["evictions"] > 0
+    warm_cache.clear()
+    assert warm_cache.cache_info()["files"] == 0
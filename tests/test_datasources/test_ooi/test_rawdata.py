@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (
+    absolute_import,
+    division,
+    print_function,
+    unicode_literals,
+)
+
+import os
+
+import pytest
+
+from yodapy.datasources.ooi.rawdata import (
+    RAW_DATA_URLS,
+    RawDataIndex,
+    RawDataRegistry,
+)
+
+
+FOLDER_URL = "https://rawdata.example.org/files/CE04OSPS/PC01B/ZPLSCB102"
+
+
+class FakeResponse:
+    def __init__(self, status_code, text="", headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code != 200:
+            raise ValueError(self.status_code)
+
+
+class FakeListing:
+    """ Directory listing server answering conditional requests """
+
+    def __init__(self, files):
+        self.files = files
+        self.requests = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.requests.append(headers)
+        etag = str(len(self.files))
+        if (headers or {}).get("If-None-Match") == etag:
+            return FakeResponse(304)
+        links = "".join(
+            f'<a href="{f}">{f}</a>\n' for f in ["../"] + self.files
+        )
+        return FakeResponse(200, links, {"ETag": etag})
+
+
+def test_raw_data_index(yodapy_dir):
+    server = FakeListing(
+        [
+            "OOI-D20180101-T120000.raw",
+            "OOI-D20180101-T000000.raw",
+            "OOI-D20180102-T000000.raw",
+        ]
+    )
+    index = RawDataIndex(session=server, ttl=0)
+
+    files = index.files(FOLDER_URL)
+    assert files.filename.tolist() == sorted(server.files)
+    assert files.urls.iloc[0] == f"{FOLDER_URL}/OOI-D20180101-T000000.raw"
+
+    selected = index.select(
+        FOLDER_URL, "2018-01-01T06:00:00", "2018-01-02T00:00:00Z"
+    )
+    assert selected.filename.tolist() == [
+        "OOI-D20180101-T120000.raw",
+        "OOI-D20180102-T000000.raw",
+    ]
+
+    # Unchanged folders are revalidated, not parsed again
+    index.files(FOLDER_URL)
+    assert server.requests[-1] == {"If-None-Match": "3"}
+
+    # New files are appended to the persisted index
+    server.files.append("OOI-D20180103-T000000.raw")
+    cached = RawDataIndex(session=server, ttl=0)
+    assert len(cached.files(FOLDER_URL)) == 4
+    assert len(cached.select(FOLDER_URL, "2018-01-02T12:00:00")) == 1
+
+    # Fresh listings are not requested again
+    fresh = RawDataIndex(session=server)
+    requests = len(server.requests)
+    assert len(fresh.files(FOLDER_URL)) == 4
+    assert len(server.requests) == requests
+
+
+class FakeServer:
+    """ Raw data server of nested folders """
+
+    def __init__(self, root, tree):
+        self.root = root
+        self.tree = tree
+        self.requests = []
+
+    def get(self, url, **kwargs):
+        self.requests.append(url)
+        folder = self.tree
+        for name in url[len(self.root) :].strip("/").split("/"):
+            if name:
+                folder = folder.get(name)
+                if folder is None:
+                    return FakeResponse(404)
+        links = "".join(
+            f'<a href="{name}/">{name}/</a>\n' for name in ["..", *folder]
+        )
+        return FakeResponse(200, f'<a href="?C=N;O=D">Name</a>{links}')
+
+
+@pytest.fixture
+def raw_data_server():
+    root = "https://rawdata.example.org/files"
+    return FakeServer(
+        root,
+        {
+            "CE04OSPS": {
+                "PC01B": {
+                    "ZPLSCB102_10.33.10.143": {},
+                    "CTDPFA107_10.33.10.140": {},
+                },
+                "SF01B": {"ZPLSCB101_10.31.1.1": {}},
+            },
+            "RS01SBPS": {"PC01A": {"HYDBBA102_10.33.3.146": {}}},
+        },
+    )
+
+
+def test_raw_data_registry(raw_data_server, yodapy_dir):
+    registry = RawDataRegistry(
+        session=raw_data_server, root=raw_data_server.root
+    )
+
+    assert registry.lookup("CE04OSPS-SF01B-2A-ZPLSCB101") == (
+        f"{raw_data_server.root}/CE04OSPS/SF01B/ZPLSCB101_10.31.1.1"
+    )
+    assert registry.lookup("RS01SBPS-PC01A-08-HYDBBA102").endswith(
+        "HYDBBA102_10.33.3.146"
+    )
+    assert registry.lookup("CE02SHBP-MJ01C-07-ZPLSCB101") is None
+    assert len(registry.folders()) == 4
+    # Site, node and instrument levels
+    assert len(raw_data_server.requests) == 1 + 2 + 3
+
+    # The crawl is cached
+    cached = RawDataRegistry(
+        session=raw_data_server, root=raw_data_server.root
+    )
+    assert len(cached.folders()) == 4
+    assert len(raw_data_server.requests) == 6
+
+
+def test_raw_data_registry_unavailable(raw_data_server, yodapy_dir):
+    registry = RawDataRegistry(
+        session=raw_data_server, root=f"{raw_data_server.root}/missing"
+    )
+    assert registry.folders() == RAW_DATA_URLS
+    assert registry.lookup("CE04OSPS-PC01B-05-ZPLSCB102") is not None
+
+    # The server is not crawled again for every lookup
+    requests = len(raw_data_server.requests)
+    for _ in range(5):
+        registry.lookup("CE02SHBP-MJ01C-07-ZPLSCB101")
+    assert len(raw_data_server.requests) == requests
+
+    # Until the failed crawl is retried
+    registry.retry_ttl = 0
+    registry.lookup("CE02SHBP-MJ01C-07-ZPLSCB101")
+    assert len(raw_data_server.requests) == requests + 1
+
+
+def test_raw_data_registry_partial_crawl(raw_data_server, yodapy_dir):
+    registry = RawDataRegistry(
+        session=raw_data_server, root=raw_data_server.root
+    )
+    folders = registry.folders()
+    assert len(folders) == 4
+
+    # A node that can not be listed, the last complete crawl is kept
+    raw_data_server.tree["RS01SBPS"]["PC01B"] = None
+    assert registry.folders(refresh=True) == folders
+
+    # Incomplete crawls are not saved
+    registry.clear()
+    assert registry.folders() == RAW_DATA_URLS
+    registry_path = yodapy_dir.joinpath("ooi", "rawdata", "registry.json")
+    assert not os.path.exists(str(registry_path))
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (
+    absolute_import,
+    division,
+    print_function,
+    unicode_literals,
+)
+
+import numpy as np
+import xarray as xr
+
+from yodapy.datasources.ooi.stream import StreamHandle
+from yodapy.utils import conn
+
+
+def test_stream_handle():
+    calls = []
+
+    def fetcher(params, variables=None, **kwargs):
+        calls.append((params, variables, kwargs))
+        ds = xr.Dataset(
+            {
+                "seawater_temperature": ("obs", np.zeros(3)),
+                "conductivity": ("obs", np.zeros(3)),
+            }
+        )
+        if variables:
+            ds = ds[variables]
+        return ds
+
+    handle = StreamHandle(
+        "RS03AXPS-PC03A-4A-CTDPFA303-streamed-ctdpf_optode_sample",
+        fetcher,
+        "turl",
+        chunk_bytes=1024,
+    )
+
+    assert calls == []
+    assert handle.open() is handle.open()
+    assert len(calls) == 1
+
+    subset = handle.subset(begin_date="2018-01-01")
+    assert len(calls) == 1
+    assert list(handle["conductivity"].values) == [0, 0, 0]
+    subset.open()
+    assert calls[1:] == [
+        ("turl", ["conductivity"], {"chunk_bytes": 1024}),
+        ("turl", None, {"chunk_bytes": 1024, "begin_date": "2018-01-01"}),
+    ]
+
+
+def test_ek60_stream_handles(monkeypatch):
+    processed = []
+
+    def fake_processing(raw_file_dict, **kwargs):
+        processed.append(raw_file_dict)
+        return {
+            ref: [raw.replace(".raw", "_MVBS.nc") for raw in raw_files]
+            for ref, raw_files in raw_file_dict.items()
+        }
+
+    monkeypatch.setattr(conn, "perform_ek60_processing", fake_processing)
+    monkeypatch.setattr(
+        conn,
+        "fetch_mvbs",
+        lambda params, variables=None, **kwargs: xr.Dataset(
+            attrs={"id": params[0], "files": params[1]}
+        ),
+    )
+    processing = conn.EK60Processing(
+        {"CE02SHBP-MJ01C": ["a.raw", "b.raw"], "CE04OSPS-PC01B": ["c.raw"]}
+    )
+    handles = [
+        StreamHandle(ref, conn.fetch_ek60, (ref, processing))
+        for ref in ["CE02SHBP-MJ01C", "CE04OSPS-PC01B"]
+    ]
+
+    # Raw files are processed once, when the first handle is opened
+    assert processed == []
+    assert handles[0].open().attrs["files"] == ["a_MVBS.nc", "b_MVBS.nc"]
+    assert handles[1].open().attrs["files"] == ["c_MVBS.nc"]
+    assert len(processed) == 1
@@ -8,17 +8,25 @@ from __future__ import (
 )
 
 import datetime
+import hashlib
 import json
 import os
 import shutil
+import time
 import warnings
 
+import numpy as np
+import pandas as pd
 import pytest
 import pytz
+import xarray as xr
 
 from requests import Session
+from requests.exceptions import HTTPError
 
 from yodapy.utils import conn, meta, parser, set_credentials_file
+from yodapy.utils.cache import DataCache
+from yodapy.utils.journal import RequestJournal
 from yodapy.utils.files import CREDENTIALS_FILE, HOME_DIR, YODAPY_DIR
 
 
@@ -129,3 +137,547 @@ def test_build_url():
     assert preload_url == f"{base_url}/12575"
     assert inv_url == f"{base_url}/12576/sensor/inv"
     assert meta_url == f"{base_url}/12587/events/deployment/inv"
+
+
+def test_split_time_range():
+    begin_dt = datetime.datetime(2019, 8, 5).replace(tzinfo=pytz.UTC)
+    end_dt = datetime.datetime(2019, 8, 6).replace(tzinfo=pytz.UTC)
+    windows = parser.split_time_range(begin_dt, end_dt, windows=4)
+
+    assert len(windows) == 4
+    assert windows[0][0] == begin_dt
+    assert windows[-1][1] == end_dt
+    assert all(a[1] == b[0] for a, b in zip(windows[:-1], windows[1:]))
+    assert windows[1][0] == begin_dt + datetime.timedelta(hours=6)
+
+
+def test_fetch_json_pages_failed_window(http_server):
+    params = {
+        "limit": 1000,
+        "beginDT": "2019-08-05T00:00:00.000Z",
+        "endDT": "2019-08-06T00:00:00.000Z",
+    }
+    with pytest.raises(HTTPError):
+        conn.fetch_json_pages(f"{http_server.url}/missing", params, windows=4)
+
+
+def test_request_journal(yodapy_dir):
+    m2m_url = "https://ooinet.oceanobservatories.org/api/m2m/12576/sensor/inv/test"
+    status_url = "https://opendap.oceanobservatories.org/async_results/test"
+    response = {
+        "requestUUID": "609c7970-8065-46fa-9fd3-0975c97a1f28",
+        "allURLs": [
+            "https://opendap.oceanobservatories.org/thredds/catalog/test/catalog.html",
+            status_url,
+        ],
+    }
+    journal = RequestJournal("test")
+    journal.clear()
+    journal.record(m2m_url, response)
+    journal.set_status(status_url, "completed")
+    journal.add_download(status_url, "deployment0001_test.nc")
+
+    resumed = RequestJournal("test")
+    job = resumed.get(m2m_url)
+
+    assert job["response"] == response
+    assert job["status"] == "completed"
+    assert job["downloaded"] == ["deployment0001_test.nc"]
+    assert resumed.pending() == [job]
+
+    resumed.set_status(status_url, "downloaded")
+    assert not resumed.pending()
+
+    # Downloaded jobs are aged out
+    assert resumed.prune() == 0
+    resumed.max_age = 0
+    assert resumed.prune() == 1
+    assert len(RequestJournal("test")) == 0
+
+
+def test_data_cache(tmpdir, yodapy_dir):
+    cache = DataCache("test", max_bytes=1024)
+    urls = [
+        f"https://opendap.oceanobservatories.org/async_results/test/file{i}.nc"
+        for i in range(3)
+    ]
+    for i, url in enumerate(urls):
+        path = str(tmpdir.join(os.path.basename(url)))
+        with open(path, "wb") as f:
+            f.write(bytes([i]) * 400)
+        cache.put(url, path)
+
+    info = cache.cache_info()
+    assert info["evictions"] == 1
+    assert info["files"] == 2
+    assert info["size"] == 800
+    assert urls[0] not in cache
+
+    # Only the same request serves the file from a new results folder
+    m2m_url = "https://ooinet.oceanobservatories.org/api/m2m/12576/sensor/inv/test?execDPA=true&beginDT=2019"
+    cache.put(urls[2], str(tmpdir.join("file2.nc")), request=m2m_url)
+    new_url = urls[2].replace("/test/", "/test2/")
+    destination = tmpdir.mkdir("destination")
+    assert cache.export(new_url, str(destination)) is None
+    other_request = m2m_url.replace("true", "false")
+    assert (
+        cache.export(new_url, str(destination), request=other_request) is None
+    )
+    same_request = m2m_url.replace(
+        "execDPA=true&beginDT=2019", "beginDT=2019&execDPA=true"
+    )
+    assert (
+        cache.export(new_url, str(destination), request=same_request)
+        == "file2.nc"
+    )
+    with open(str(destination.join("file2.nc")), "rb") as f:
+        assert f.read() == bytes([2]) * 400
+    assert cache.get(urls[0]) is None
+    assert cache.cache_info()["hits"] == 1
+    assert cache.cache_info()["misses"] == 3
+
+    # Exported files are copies
+    with open(str(destination.join("file2.nc")), "r+b") as f:
+        f.write(b"edited")
+    with open(cache.get(urls[2]), "rb") as f:
+        assert f.read() == bytes([2]) * 400
+
+    # Hits only write the index once flushed
+    index_path = os.path.join(cache.cache_info()["path"], "index.json")
+    saved = os.stat(index_path).st_mtime_ns
+    time.sleep(0.01)
+    cache.get(urls[1])
+    assert os.stat(index_path).st_mtime_ns == saved
+    cache.flush()
+    assert os.stat(index_path).st_mtime_ns != saved
+    cache.clear()
+
+
+def fake_processed_ek60(temp_file, clean_up=True, params=None, in_memory=True):
+    if "corrupt" in temp_file:
+        raise ValueError(f"{temp_file} is corrupt")
+    mvbs = temp_file.replace(".raw", "_MVBS.nc")
+    with open(mvbs, "w") as f:
+        f.write(f"{temp_file} {params}")
+    return mvbs
+
+
+def failed_processed_ek60(temp_file, **kwargs):
+    raise AssertionError(f"{temp_file} processed again")
+
+
+def test_ek60_processing_isolation(monkeypatch, tmpdir):
+    monkeypatch.setattr(conn, "get_processed_ek60", fake_processed_ek60)
+    raw_files = {
+        name: str(tmpdir.join(f"{name}.raw")) for name in ["a", "corrupt", "b"]
+    }
+    raw_file_dict = {
+        "CE02SHBP-MJ01C": [raw_files["a"], raw_files["corrupt"], None],
+        "CE04OSPS-PC01B": [raw_files["b"]],
+    }
+
+    assert conn.perform_ek60_processing(raw_file_dict, max_workers=2) == {
+        "CE02SHBP-MJ01C": [str(tmpdir.join("a_MVBS.nc"))],
+        "CE04OSPS-PC01B": [str(tmpdir.join("b_MVBS.nc"))],
+    }
+
+
+def test_ek60_processing_cache(monkeypatch, tmpdir, yodapy_dir):
+    monkeypatch.setattr(conn, "get_processed_ek60", fake_processed_ek60)
+    cache = DataCache("test")
+    raw_files = []
+    for i in range(4):
+        raw_files.append(str(tmpdir.join(f"OOI-D2019010{i}-T000000.raw")))
+        with open(raw_files[-1], "wb") as f:
+            f.write(os.urandom(1024))
+    raw_file_dict = {"CE02SHBP-MJ01C": raw_files}
+
+    mvbs_files = conn.perform_ek60_processing(
+        raw_file_dict, max_workers=2, cache=cache
+    )
+    assert len(mvbs_files["CE02SHBP-MJ01C"]) == 4
+    assert cache.cache_info()["misses"] == 4
+
+    # Processed files are taken from the cache, not processed again
+    monkeypatch.setattr(conn, "get_processed_ek60", failed_processed_ek60)
+    mvbs_files = {
+        "CE02SHBP-MJ01C": [raw.replace(".raw", "_MVBS.nc") for raw in raw_files]
+    }
+    assert (
+        conn.perform_ek60_processing(raw_file_dict, max_workers=2, cache=cache)
+        == mvbs_files
+    )
+    assert cache.cache_info()["hits"] == 4
+
+    # Other processing parameters are processed again
+    monkeypatch.setattr(conn, "get_processed_ek60", fake_processed_ek60)
+    params = {"get_MVBS": {"MVBS_ping_size": 30}}
+    conn.perform_ek60_processing(
+        raw_file_dict, max_workers=2, params=params, cache=cache
+    )
+    assert cache.cache_info()["entries"] == 8
+
+    # Cached files are copied over the MVBS netcdfs of other parameters
+    monkeypatch.setattr(conn, "get_processed_ek60", failed_processed_ek60)
+    conn.perform_ek60_processing(raw_file_dict, max_workers=2, cache=cache)
+    cache.clear()
+    for raw, mvbs in zip(raw_files, mvbs_files["CE02SHBP-MJ01C"]):
+        with open(mvbs) as f:
+            assert f.read() == f"{raw} None"
+
+
+def test_iter_download_urls(http_server):
+    names = [f"deployment0001_test_{i:05d}.nc" for i in range(2000)]
+    listing = "".join(
+        [f'<tr><td><a href="{name}">{name}</a></td></tr>' for name in names]
+        + ['<tr><td><a href="status.txt">status.txt</a></td></tr>']
+    )
+    http_server.files["results"] = (
+        f"<html><body><table>{listing}</table></body></html>".encode()
+    )
+    url = f"{http_server.url}/results"
+
+    nc_urls = conn.iter_download_urls(url, chunk_size=1024)
+
+    assert next(nc_urls) == f"{url}/{names[0]}"
+    assert list(nc_urls) == [f"{url}/{name}" for name in names[1:]]
+
+
+def test_download_url_retries(http_server, tmpdir):
+    url = f"{http_server.url}/missing.nc"
+
+    assert (
+        conn.download_url(
+            url, str(tmpdir), Session(), retries=3, backoff_factor=0
+        )
+        is None
+    )
+    assert [path for _, path, _ in http_server.requests] == ["/missing.nc"] * 3
+
+
+def test_download_url_resume(http_server, tmpdir):
+    data = b"CDF\x01" + os.urandom(1024 * 1024)
+    http_server.files["data.nc"] = data
+    # Interrupted download
+    with open(str(tmpdir.join("data.nc.part")), "wb") as f:
+        f.write(data[:1000])
+
+    fname = conn.download_url(
+        f"{http_server.url}/data.nc",
+        str(tmpdir),
+        Session(),
+        checksum=hashlib.md5(data).hexdigest(),
+    )
+
+    assert fname == "data.nc"
+    assert ("GET", "/data.nc", "bytes=1000-") in http_server.requests
+    with open(str(tmpdir.join(fname)), "rb") as f:
+        assert f.read() == data
+    assert not tmpdir.join("data.nc.part").exists()
+
+
+def test_download_url_validate(http_server, tmpdir):
+    http_server.files["data.nc"] = b"<html>Service unavailable</html>"
+    url = f"{http_server.url}/data.nc"
+
+    assert (
+        conn.download_url(
+            url, str(tmpdir), Session(), retries=2, backoff_factor=0
+        )
+        is None
+    )
+    assert len(http_server.requests) == 2
+    assert not tmpdir.join("data.nc").exists()
+
+    # Custom checks, or none
+    def reject(path, checksum=None):
+        raise ValueError(f"{path} rejected")
+
+    assert (
+        conn.download_url(
+            url, str(tmpdir), Session(), retries=1, validate=reject
+        )
+        is None
+    )
+    assert (
+        conn.download_url(url, str(tmpdir), Session(), validate=None)
+        == "data.nc"
+    )
+
+
+def test_segmented_download_fallback(http_server, tmpdir):
+    netcdf_bytes = b"CDF\x01" + os.urandom(4 * 1024 * 1024)
+    http_server.files["data.nc"] = netcdf_bytes
+    http_server.accept_ranges = False
+
+    fname = conn.download_segmented(
+        f"{http_server.url}/data.nc", folder=str(tmpdir), segments=4
+    )
+
+    with open(str(tmpdir.join(fname)), "rb") as f:
+        assert f.read() == netcdf_bytes
+
+
+def test_segment_count():
+    assert conn.segment_count(1024) == 1
+    assert conn.segment_count(conn.SEGMENT_SIZE * 3 + 1) == 4
+    assert conn.segment_count(conn.SEGMENT_SIZE * 100) == conn.MAX_SEGMENTS
+
+
+def test_perform_ek60_download(http_server, concurrency, monkeypatch, tmpdir):
+    monkeypatch.setattr(conn, "create_folder", lambda name: str(tmpdir))
+    ref = "CE02SHBP-MJ01C"
+    names = [f"OOI-D2019010{i}-T000000.raw" for i in range(6)]
+    for name in names:
+        http_server.files[name] = os.urandom(256 * 1024)
+    raw_df = pd.DataFrame(
+        {
+            "filename": names,
+            "urls": [f"{http_server.url}/{name}" for name in names],
+        }
+    )
+
+    # An interrupted download and a complete one
+    os.makedirs(str(tmpdir.join(ref)))
+    with open(str(tmpdir.join(ref, f"{names[0]}.part")), "wb") as f:
+        f.write(http_server.files[names[0]][: 100 * 1024])
+    with open(str(tmpdir.join(ref, names[1])), "wb") as f:
+        f.write(http_server.files[names[1]])
+
+    workers = 2
+    # Passes only once max_workers downloads run at the same time
+    monkeypatch.setattr(
+        conn,
+        "download_raw_file",
+        concurrency.wrap(conn.download_raw_file, barrier=workers),
+    )
+    raw_files = conn.perform_ek60_download({ref: raw_df}, max_workers=workers)
+
+    assert raw_files[ref] == [str(tmpdir.join(ref, name)) for name in names]
+    for name in names:
+        with open(str(tmpdir.join(ref, name)), "rb") as f:
+            assert f.read() == http_server.files[name]
+    assert not os.path.exists(str(tmpdir.join(ref, f"{names[0]}.part")))
+    # Downloads run concurrently, at most max_workers at a time
+    assert concurrency.peak == workers
+
+
+def test_get_thredds_catalog(monkeypatch, tmpdir):
+    listings = []
+
+    class FakeCatalog:
+        def __init__(self, caturl):
+            listings.append(caturl)
+            self.datasets = {
+                name: type(
+                    "Dataset",
+                    (),
+                    {"name": name, "access_urls": {"OPENDAP": name}},
+                )
+                for name in names
+            }
+
+    monkeypatch.setattr(parser, "TDSCatalog", FakeCatalog)
+    caturl = (
+        "https://opendap.oceanobservatories.org/thredds"
+        "/catalog/ooi/test/catalog.xml"
+    )
+    parser.clear_thredds_catalogs()
+
+    # Empty catalogs of requests still being filled are not kept
+    names = []
+    assert parser.get_thredds_catalog(caturl, cache_dir=str(tmpdir)) == []
+    names = ["deployment0001_test.nc"]
+    datasets = parser.get_thredds_catalog(caturl, cache_dir=str(tmpdir))
+    assert [d["name"] for d in datasets] == names
+    assert len(listings) == 2
+
+    parser.get_thredds_catalog(caturl, cache_dir=str(tmpdir))
+    parser.clear_thredds_catalogs()
+    parser.get_thredds_catalog(caturl, cache_dir=str(tmpdir))
+    assert len(listings) == 2
+
+    # Expired in memory and on disk
+    names.append("deployment0002_test.nc")
+    datasets = parser.get_thredds_catalog(
+        caturl, cache_dir=str(tmpdir), ttl=0
+    )
+    assert len(datasets) == 2
+    assert len(listings) == 3
+    parser.clear_thredds_catalogs()
+
+
+def test_filter_time_range():
+    datasets = [
+        {"name": f"CE02SHBP-LJ01D-06-CTDBPN106-streamed-ctdbp_no_sample_201908{day:02d}.nc"}
+        for day in range(1, 10)
+    ]
+    filtered = parser.filter_time_range(
+        datasets,
+        datetime.datetime(2019, 8, 3),
+        datetime.datetime(2019, 8, 5),
+        regex=r"(?P<year>\d{4})(?P<month>[01]\d)(?P<day>[0123]\d)",
+    )
+
+    assert filtered == datasets[2:5]
+
+
+def test_auto_chunks():
+    ds = xr.Dataset(
+        {
+            "seawater_temperature": ("obs", np.zeros(1000, dtype="f4")),
+            "spectra": (("obs", "wavelength"), np.zeros((1000, 8))),
+        },
+        coords={"time": ("obs", np.arange(1000, dtype="f8"))},
+    )
+
+    assert parser.auto_chunks(ds, target_bytes=64 * 100) == {"obs": 100}
+    assert parser.auto_chunks(ds, target_bytes=1) == {"obs": 1}
+    assert parser.auto_chunks(ds) == {"obs": 1000}
+    assert parser.auto_chunks(ds.drop_dims("obs")) == {}
+
+
+def test_variable_drops():
+    ds = xr.Dataset(
+        {
+            "seawater_temperature": (
+                "obs",
+                np.zeros(10),
+                {"coordinates": "time lat lon pressure"},
+            ),
+            "pressure": ("obs", np.zeros(10)),
+            "conductivity": ("obs", np.zeros(10)),
+            "provenance": ("obs", np.zeros(10)),
+            "time": ("obs", np.zeros(10)),
+            "lat": ("obs", np.zeros(10)),
+            "lon": ("obs", np.zeros(10)),
+        }
+    )
+
+    assert parser.variable_drops(ds, ["seawater_temperature"]) == [
+        "conductivity",
+        "provenance",
+    ]
+    assert parser.variable_drops(ds, ["not_a_variable"]) == []
+
+
+def test_filter_time_coverage():
+    fname = "deployment0004_RS03AXPS-PC03A-4A-CTDPFA303-streamed-ctdpf_optode_sample_{}.nc"
+    urls = [
+        fname.format("20180101T000000.596438-20180131T235959.815406"),
+        fname.format("20180201T000000.123456-20180228T235959.815406"),
+        "https://opendap.oceanobservatories.org/thredds/dodsC/ooi/deployment0004_ancillary.nc",
+    ]
+
+    assert parser.file_time_coverage(urls[0]) == (
+        datetime.datetime(2018, 1, 1),
+        datetime.datetime(2018, 1, 31, 23, 59, 59),
+    )
+    assert parser.file_time_coverage(urls[2]) is None
+    assert parser.filter_time_coverage(
+        urls, datetime.datetime(2018, 2, 10), datetime.datetime(2018, 3, 1)
+    ) == urls[1:]
+    assert parser.filter_time_coverage(urls) == urls
+
+
+def test_time_slicer():
+    ds = xr.Dataset(
+        {"seawater_temperature": ("obs", np.arange(10))},
+        coords={
+            "time": (
+                "obs",
+                np.arange(
+                    "2018-01-01", "2018-01-11", dtype="datetime64[D]"
+                ).astype("datetime64[ns]"),
+            )
+        },
+    )
+    preprocess = parser.time_slicer(
+        datetime.datetime(2018, 1, 3), datetime.datetime(2018, 1, 5)
+    )
+
+    assert list(preprocess(ds).seawater_temperature.values) == [2, 3, 4]
+    assert parser.naive_datetime("2018-01-03T08:00:00-08:00") == (
+        datetime.datetime(2018, 1, 3, 16)
+    )
+
+
+def test_iter_concurrently():
+    def wait(seconds):
+        if seconds < 0:
+            raise ValueError("negative")
+        time.sleep(seconds)
+        return seconds
+
+    results = list(conn.iter_concurrently(wait, [(0.2,), (-1,), (0.0,)]))
+    assert results == [((0.0,), 0.0), ((0.2,), 0.2)]
+
+    results = list(
+        conn.iter_concurrently(wait, [(0.0,), (1.0,)], timeout=0.5)
+    )
+    assert results == [((0.0,), 0.0)]
+
+
+def test_run_concurrently_bounded(concurrency):
+    workers = 4
+    # Passes only once max_workers calls run at the same time
+    task = concurrency.wrap(lambda i: i, barrier=workers)
+
+    results = conn.run_concurrently(
+        task, [(i,) for i in range(2 * workers)], max_workers=workers
+    )
+
+    assert results == list(range(2 * workers))
+    assert concurrency.peak == workers
+
+
+def test_run_concurrently_failures():
+    def divide(a, b):
+        return a / b
+
+    assert conn.run_concurrently(divide, [(1, 1), (1, 0), (4, 2)]) == [
+        1,
+        None,
+        2,
+    ]
+
+
+def test_write_zarr(tmpdir):
+    def stream(start, periods):
+        return xr.Dataset(
+            {"seawater_temperature": ("obs", np.arange(periods) + start)},
+            coords={
+                "time": (
+                    "obs",
+                    np.datetime64("2018-01-01")
+                    + np.arange(start, start + periods).astype(
+                        "timedelta64[h]"
+                    ),
+                )
+            },
+        )
+
+    store = str(tmpdir.join("ooi.zarr"))
+    group = "RS03AXPS-PC03A-4A-CTDPFA303-streamed-ctdpf_optode_sample"
+
+    assert conn.zarr_time_coverage(store, group) is None
+    assert conn.write_zarr(stream(0, 10), store, group, chunk_bytes=32) == 10
+    assert conn.write_zarr(stream(5, 10), store, group, chunk_bytes=32) == 5
+    assert conn.write_zarr(stream(0, 15), store, group) == 0
+
+    ds = xr.open_zarr(store, group=group, consolidated=True)
+    assert list(ds.seawater_temperature.values) == list(range(15))
+    assert ds.seawater_temperature.encoding["chunks"] == (4,)
+    assert conn.zarr_time_coverage(store, group)[1] == np.datetime64(
+        "2018-01-01T14:00"
+    )
+
+    # MVBS datasets are indexed by ping time
+    mvbs = stream(0, 10).rename({"time": "ping_time", "obs": "ping_time"})
+    assert conn.write_zarr(mvbs, store, "CE02SHBP-MJ01C") == 10
+    assert conn.write_zarr(mvbs, store, "CE02SHBP-MJ01C") == 0
+    assert conn.zarr_time_coverage(store, "CE02SHBP-MJ01C")[1] == (
+        np.datetime64("2018-01-01T09:00")
+    )
+    with pytest.raises(ValueError):
+        conn.write_zarr(stream(0, 10).drop_vars("time"), store, "no-time")
@@ -8,36 +8,58 @@ import threading
 import time
 import warnings
 
+from concurrent.futures import ThreadPoolExecutor
 from io import StringIO
 from queue import Queue
 
-import gevent
 import pandas as pd
 import pytz
 import requests
-import s3fs
 import urllib3
-import xarray as xr
 
 from dateutil import parser
-from lxml.html import fromstring as html_parser
 
 from yodapy.datasources.ooi.CAVA import CAVA
+from yodapy.datasources.ooi.cloud import (
+    DEFAULT_CHUNK_CACHE_SIZE,
+    FILE_SYSTEM,
+    ChunkCache,
+    CloudCatalog,
+    fetch_zarr,
+)
 from yodapy.datasources.ooi.helpers import set_thread
+from yodapy.datasources.ooi.rawdata import (
+    RAW_INSTRUMENTS,
+    RawDataIndex,
+    RawDataRegistry,
+)
+from yodapy.datasources.ooi.stream import StreamHandle
+from yodapy.utils.cache import DEFAULT_CACHE_SIZE, DataCache
 from yodapy.utils.conn import (
+    DOWNLOAD_BUFFER_SIZE,
+    M2M_JSON_LIMIT,
+    MAX_WORKERS,
+    EK60Processing,
     download_url,
+    fetch_ek60,
+    fetch_json_pages,
     fetch_url,
     fetch_xr,
-    get_download_urls,
     instrument_to_query,
+    iter_concurrently,
+    iter_download_urls,
     perform_ek60_download,
-    perform_ek60_processing,
+    run_concurrently,
+    write_zarr,
+    zarr_time_coverage,
 )
 from yodapy.utils.files import CREDENTIALS_FILE
-from yodapy.utils.meta import delete_all_cache
+from yodapy.utils.journal import RequestJournal
+from yodapy.utils.meta import create_folder, delete_all_cache
 from yodapy.utils.parser import (
+    CHUNK_BYTES,
     get_instrument_list,
-    get_nc_urls,
+    naive_datetime,
     parse_annotations_json,
     parse_deployments_json,
     parse_global_range_dataframe,
@@ -61,8 +83,6 @@ logger = logging.getLogger(__name__)
 print_lock = threading.Lock()
 
 DATA_TEAM_GITHUB_INFRASTRUCTURE = "https://raw.githubusercontent.com/ooi-data-review/datateam-portal-backend/master/infrastructure"
-FILE_SYSTEM = s3fs.S3FileSystem(anon=True)
-BUCKET_DATA = "io2data/data"
 
 
 class OOI(CAVA):
@@ -143,25 +163,34 @@ class OOI(CAVA):
         self._rstreams = None
         self._rtoc = None
 
-        self._raw_datadf = None
-        self._raw_data_url = None
-
-        # For bio-acoustic sonar
-        self._zplsc_data_catalog = None
+        # Instruments retrieved as raw files, e.g. bio-acoustic sonars
+        self._raw_instruments = tuple(
+            kwargs.get("raw_instruments", RAW_INSTRUMENTS)
+        )
+        self._raw_data_catalog = None
         self._raw_file_dict = None
 
         self._data_type = None
 
         self._current_data_catalog = None
         self._filtered_data_catalog = None
+        self._selected_parameters = None
 
         self._q = None
         self._raw_data = []
         self._dataset_list = []
-        self._netcdf_urls = []
+        self._stream_handles = []
 
         # Cloud copy
-        self._s3content = None
+        self._cloud_catalog = CloudCatalog(source_name=self._source_name)
+        self._chunk_cache = None
+        if cloud_source and kwargs.get("cloud_cache", False):
+            self._chunk_cache = ChunkCache(
+                max_bytes=kwargs.get(
+                    "cloud_cache_size", DEFAULT_CHUNK_CACHE_SIZE
+                ),
+                source_name=self._source_name,
+            )
         self._cloud_source = cloud_source
         # ----------- Session Configs ---------------------
         self._session = requests.Session()
@@ -172,12 +201,30 @@ class OOI(CAVA):
             pool_maxsize=self._pool_maxsize,
         )
         self._session.mount("https://", self._adapter)
+
+        # Raw data server listings, fetched when raw data is requested
+        self._raw_registry = RawDataRegistry(
+            session=self._session, source_name=self._source_name
+        )
+        self._raw_index = RawDataIndex(
+            session=self._session, source_name=self._source_name
+        )
         self._session.verify = False
+        self._buffer_size = kwargs.get("buffer_size", DOWNLOAD_BUFFER_SIZE)
+        self._max_workers = kwargs.get("max_workers", MAX_WORKERS)
         # --------------------------------------------------
 
         self._request_urls = None
+        self._journal = RequestJournal(self._source_name)
+        self._cache = DataCache(
+            self._source_name,
+            max_bytes=kwargs.get("cache_size", DEFAULT_CACHE_SIZE),
+        )
+        self._resume = False
         self._last_m2m_urls = []
         self._last_download_list = None
+        self._download_urls = {}
+        self._listing_errors = {}
         self._last_downloaded_netcdfs = None
         self._thread_list = []
 
@@ -429,7 +476,6 @@ class OOI(CAVA):
                 threads = [
                     ("get-data-catalog", self._get_data_catalog),
                     ("get-global-ranges", self._get_global_ranges),
-                    ("get-rawdata-filelist", self._get_rawdata_filelist),
                 ]  # noqa
                 for t in threads:
                     ft = set_thread(*t)
@@ -441,18 +487,39 @@ class OOI(CAVA):
         except Exception as e:
             logger.error(f"Server not available, please try again later: {e}")
 
-        # Retrieve datasets info in the s3 bucket.
-        try:
-            self._s3content = [
-                os.path.basename(rd) for rd in FILE_SYSTEM.ls(BUCKET_DATA)
-            ]
-        except Exception as e:
-            logger.error(e)
-
     def clear_cache(self):
         # TODO: This should also delete netcdf urls from Uframe!
+        self._cache.clear()
+        self._cloud_catalog.clear()
+        self._raw_registry.clear()
+        self._raw_index.clear()
+        if self._chunk_cache:
+            self._chunk_cache.clear()
         delete_all_cache(self._source_name)
 
+    def cache_info(self):
+        """
+        Returns statistics of the local data cache.
+
+        Returns:
+            dict: Cache hits, misses and evictions, number of entries and files,
+            size and size budget in bytes, and the cache location.
+        """
+        return self._cache.cache_info()
+
+    def cloud_cache_info(self):
+        """
+        Returns statistics of the local zarr chunk cache, used with ``cloud_source`` and ``cloud_cache``.
+
+        Returns:
+            dict: Cache hits, misses and evictions, number of files,
+            size and size budget in bytes, and the cache location.
+            None when the chunk cache is not enabled.
+        """
+        if self._chunk_cache:
+            return self._chunk_cache.cache_info()
+        return None
+
     def request_data(
         self, begin_date, end_date, data_type="netcdf", limit=-1, **kwargs
     ):
@@ -468,13 +535,27 @@ class OOI(CAVA):
                 **time_check** - set to true (default) to ensure the request times fall within the stream data availability \n
                 **exec_dpa** - boolean value specifying whether to execute all data product algorithms to return L1/L2 parameters (Default is True) \n
                 **provenance** - boolean value specifying whether provenance information should be included in the data set (Default is True) \n
-                **email** - provide email.
+                **email** - provide email. \n
+                **paginate** - set to true to fetch 'json' requests in time windows that stay under the data points limit (Default is False) \n
+                **windows** - number of time windows a paginated request starts with (Default is 1) \n
+                **max_workers** - maximum number of pages or raw files fetched concurrently (Defaults to the OOI object ``max_workers``) \n
+                **resume** - set to true to reuse matching requests from the request journal instead of resubmitting them (Default is False)
         Returns:
             self: Modified OOI Object. Use ``raw()`` to see either data url for netcdf or json result for json.
 
         """
 
         self._data_type = data_type
+        paginate = kwargs.pop("paginate", False)
+        windows = kwargs.pop("windows", 1)
+        max_workers = kwargs.pop("max_workers", self._max_workers)
+        self._resume = kwargs.pop("resume", False)
+        if paginate:
+            if data_type != "json":
+                raise ValueError("Only 'json' requests can be paginated")
+            if limit <= 0 or limit > M2M_JSON_LIMIT:
+                limit = M2M_JSON_LIMIT
+
         begin_dates = list(map(lambda x: x.strip(" "), begin_date.split(",")))
         end_dates = list(map(lambda x: x.strip(" "), end_date.split(",")))
 
@@ -505,6 +586,10 @@ class OOI(CAVA):
         self._start_date = (begin_date,)
         self._end_date = end_dates
 
+        if len(self._raw_data) > 0:
+            self._raw_data = []
+        self._stream_handles = []
+
         request_urls = []
         if self._cloud_source:
             data_catalog_copy.loc[:, "user_begin"] = pd.to_datetime(
@@ -523,38 +608,25 @@ class OOI(CAVA):
             )
             data_catalog_copy.loc[:, "rd_path"] = data_catalog_copy[
                 "full_rd"
-            ].apply(lambda row: "/".join([BUCKET_DATA, row]))
+            ].apply(lambda row: "/".join([self._cloud_catalog.bucket, row]))
             request_urls = data_catalog_copy["rd_path"].values.tolist()
 
             for idx, row in data_catalog_copy.iterrows():
-                tempdf = pd.DataFrame(
-                    FILE_SYSTEM.ls(row["rd_path"]), columns=["uri"]
+                selected = self._cloud_catalog.select(
+                    row["full_rd"], row["user_begin"], row["user_end"]
                 )
-                tempdf.loc[:, "time"] = tempdf.apply(
-                    lambda r: pd.to_datetime(os.path.basename(r["uri"])),
-                    axis=1,
-                )
-                selected = tempdf[
-                    (tempdf.time >= row["user_begin"])
-                    & (tempdf.time <= row["user_end"])
-                ]
                 if len(selected) > 0:
                     self._q.put([selected, row["user_begin"], row["user_end"]])
 
         else:
             data_catalog_copy["user_begin"] = begin_dates
             data_catalog_copy["user_end"] = end_dates
-            # For bio-acoustic sonar only
-            self._zplsc_data_catalog = data_catalog_copy[
-                data_catalog_copy.instrument_name.str.contains(
-                    "bio-acoustic sonar", case=False
-                )
-            ]
-            data_catalog_copy = data_catalog_copy[
-                ~data_catalog_copy.instrument_name.str.contains(
-                    "bio-acoustic sonar", case=False
-                )
-            ]
+            # Instruments with raw data files only
+            is_raw = data_catalog_copy.reference_designator.apply(
+                lambda rd: rd.split("-")[-1].startswith(self._raw_instruments)
+            )
+            self._raw_data_catalog = data_catalog_copy[is_raw]
+            data_catalog_copy = data_catalog_copy[~is_raw]
             if len(data_catalog_copy) > 0:
                 request_urls = [
                     instrument_to_query(
@@ -575,37 +647,43 @@ class OOI(CAVA):
                     for idx, row in data_catalog_copy.iterrows()
                 ]
 
-                prepared_requests = [
-                    requests.Request(
-                        "GET",
-                        data_url,
-                        auth=(self.ooi_username, self.ooi_token),
-                        params=params,
+                if paginate:
+                    self._perform_paginated_request(
+                        request_urls, windows=windows, max_workers=max_workers
                     )
-                    for data_url, params in request_urls
-                ]  # noqa
+                else:
+                    prepared_requests = [
+                        requests.Request(
+                            "GET",
+                            data_url,
+                            auth=(self.ooi_username, self.ooi_token),
+                            params=params,
+                        )
+                        for data_url, params in request_urls
+                    ]  # noqa
 
-                for job in prepared_requests:
-                    prepped = job.prepare()
-                    self._last_m2m_urls.append(prepped.url)
-                    self._q.put(prepped)
+                    for job in prepared_requests:
+                        prepped = job.prepare()
+                        self._last_m2m_urls.append(prepped.url)
+                        self._q.put(prepped)
 
-        if len(self._raw_data) > 0:
-            self._raw_data = []
         self._process_request()
 
         # block until all tasks are done
         self._q.join()
 
-        if isinstance(self._zplsc_data_catalog, pd.DataFrame):
-            if len(self._zplsc_data_catalog) > 0:
-                self._zplsc_data_catalog.loc[
-                    :, "ref"
-                ] = self._zplsc_data_catalog.reference_designator.apply(
-                    lambda rd: rd[:14]
-                )
+        if isinstance(self._raw_data_catalog, pd.DataFrame):
+            if len(self._raw_data_catalog) > 0:
                 filtered_datadf = {}
-                for idx, row in self._zplsc_data_catalog.iterrows():
+                for idx, row in self._raw_data_catalog.iterrows():
+                    raw_url = self._raw_registry.lookup(
+                        row["reference_designator"]
+                    )
+                    if raw_url is None:
+                        logger.warning(
+                            f"No raw data folder for {row['reference_designator']}"
+                        )
+                        continue
                     fullref = "-".join(
                         [
                             row["reference_designator"],
@@ -613,16 +691,14 @@ class OOI(CAVA):
                             row["stream_rd"],
                         ]
                     )
-                    filtered_datadf[fullref] = self._raw_datadf[row["ref"]][
-                        row["user_begin"] : row["user_end"]
-                    ].copy()
-                    filtered_rawdata = filtered_datadf[fullref]
-                    filtered_rawdata.loc[
-                        :, "urls"
-                    ] = filtered_rawdata.filename.apply(
-                        lambda f: "/".join([self._raw_data_url[row["ref"]], f])
+                    filtered_datadf[fullref] = self._raw_index.select(
+                        raw_url, row["user_begin"], row["user_end"]
                     )
-                raw_file_dict = perform_ek60_download(filtered_datadf)
+                raw_file_dict = perform_ek60_download(
+                    filtered_datadf,
+                    max_workers=max_workers,
+                    session=self._session,
+                )
                 self._raw_file_dict = raw_file_dict
                 self._raw_data.append(raw_file_dict)
         self._request_urls = request_urls
@@ -651,6 +727,7 @@ class OOI(CAVA):
             stream_method (str): Stream method. If multiple use comma separated.
             stream (str): Stream name. If multiple use comma separated.
             parameter (str): Parameter name. If multiple use comma separated.
+                Only the matching parameters and their coordinates are loaded by ``to_xarray``.
 
         Returns:
             self: Modified OOI Object
@@ -663,6 +740,7 @@ class OOI(CAVA):
             self._current_data_catalog = current_dcat
 
         if self._cloud_source:
+            s3content = set(self._cloud_catalog.streams())
             current_dcat = current_dcat[
                 current_dcat.apply(
                     lambda row: "-".join(
@@ -672,7 +750,7 @@ class OOI(CAVA):
                             row["stream_rd"],
                         ]
                     )
-                    in self._s3content,
+                    in s3content,
                     axis=1,
                 )
             ].reset_index(drop="index")
@@ -776,6 +854,21 @@ class OOI(CAVA):
                     "|".join(stream_search), flags=re.IGNORECASE
                 )
             ]  # noqa
+        self._selected_parameters = None
+        if parameter:
+            # Parameters to read per stream, see to_xarray
+            self._selected_parameters = (
+                current_dcat.assign(
+                    stream_key=current_dcat.reference_designator
+                    + "-"
+                    + current_dcat.stream_method
+                    + "-"
+                    + current_dcat.stream_rd
+                )
+                .groupby("stream_key")
+                .parameter_rd.apply(list)
+                .to_dict()
+            )
         self._filtered_data_catalog = current_dcat.drop_duplicates(
             subset=["reference_designator", "stream_method", "stream_rd"]
         )[
@@ -809,89 +902,286 @@ class OOI(CAVA):
         """
         if isinstance(self._filtered_data_catalog, pd.DataFrame):
             self._filtered_data_catalog = None
+        self._selected_parameters = None
         return self
 
     def raw(self):
         """ Returns the raw result from data request in json format """
         return self._raw_data
 
-    def download_netcdfs(self, destination=os.path.curdir, timeout=3600):
+    def resume_requests(self):
+        """
+        Resume the netcdf data requests recorded in the request journal
+        that have not been fully downloaded, e.g. after a process restart.
+
+        Returns:
+            self: Modified OOI Object. Use ``download_netcdfs()`` or ``to_xarray()`` to continue.
+        """
+        jobs = self._journal.pending()
+        if not jobs:
+            logger.info("No pending requests found in the request journal.")
+
+        self._data_type = "netcdf"
+        self._q = Queue()
+        self._raw_data = [job["response"] for job in jobs]
+        self._last_m2m_urls = [job["m2m_url"] for job in jobs]
+        self._request_urls = self._last_m2m_urls
+        return self
+
+    def download_netcdfs(
+        self,
+        destination=os.path.curdir,
+        timeout=3600,
+        retries=5,
+        segments=1,
+        use_cache=True,
+        max_workers=None,
+    ):
         """
         Download netcdf files from the catalog created from data request.
 
         Args:
             destination (str, optional): Location to save netcdf file. Default will save in current directory.
             timeout (int, optional): Expected download time before timing out in seconds. Defaults to 30min or 3600s.
+            retries (int, optional): Maximum number of attempts per file. Interrupted downloads are resumed. Defaults to 5.
+            segments (int or str, optional): Number of byte ranges each file is split into and downloaded concurrently.
+                'auto' chooses the count from the file size. Defaults to 1.
+            use_cache (bool, optional): Take files from the local data cache when present,
+                and add new downloads to it. Defaults to True.
+            max_workers (int, optional): Maximum number of files downloaded concurrently.
+                Defaults to the OOI object ``max_workers``.
 
         Returns:
             list: List of exported netcdf.
+
+        Raises:
+            ConnectionError: When the file listing of a request failed or was empty.
+                The files of the other requests are still downloaded and the failed
+                requests stay pending in the request journal.
         """
         if not isinstance(timeout, int):
             raise TypeError(f"Expected int; {type(int)} given.")
 
-        download_list = self._prepare_download()
+        finished_netcdfs = []
+        download_list = []
+        self._last_download_list = []
+
+        def pending_downloads():
+            """ Skip journaled and cached files as the listings come in """
+            for url in self._iter_download_list(max_workers=max_workers):
+                self._last_download_list.append(url)
+                job = self._journal.find(os.path.dirname(url))
+                fname = os.path.basename(url)
+                request = job["m2m_url"] if job else None
+                if (
+                    job
+                    and fname in job["downloaded"]
+                    and os.path.exists(os.path.join(destination, fname))
+                ):
+                    finished_netcdfs.append(fname)
+                elif use_cache and self._cache.export(
+                    url, destination, request=request
+                ):
+                    logger.info(f"{fname} found in cache.")
+                    self._journal.add_download(os.path.dirname(url), fname)
+                    finished_netcdfs.append(fname)
+                else:
+                    download_list.append(url)
+                    yield (url, destination, self._session)
+
         logger.info("Downloading netcdfs ...")
-        jobs = [
-            gevent.spawn(download_url, url, destination, self._session)
-            for url in download_list
-        ]
-        gevent.joinall(jobs, timeout=timeout)
-        finished_netcdfs = [job.value for job in jobs]
+        downloaded = run_concurrently(
+            download_url,
+            pending_downloads(),
+            max_workers=max_workers or self._max_workers,
+            timeout=timeout,
+            retries=retries,
+            buffer_size=self._buffer_size,
+            segments=segments,
+        )
+        for url, fname in zip(download_list, downloaded):
+            if fname:
+                self._journal.add_download(os.path.dirname(url), fname)
+                if use_cache:
+                    job = self._journal.find(os.path.dirname(url))
+                    self._cache.put(
+                        url,
+                        os.path.join(destination, fname),
+                        request=job["m2m_url"] if job else None,
+                    )
+                finished_netcdfs.append(fname)
+        self._cache.flush()
+        for rurl in self.raw():
+            status_url = rurl["allURLs"][1]
+            nc_urls = self._download_urls.get(status_url)
+            # Requests still compiling get more files, keep them pending
+            if (
+                nc_urls
+                and all(
+                    os.path.basename(url) in finished_netcdfs
+                    for url in nc_urls
+                )
+                and self._request_completed(status_url)
+            ):
+                self._journal.set_status(status_url, "downloaded")
+
         if finished_netcdfs:
             self._last_downloaded_netcdfs = [
                 os.path.join(os.path.abspath(destination), nc)
                 for nc in finished_netcdfs
             ]  # noqa
+        self._raise_listing_errors()
         return self._last_downloaded_netcdfs
 
-    def to_xarray(self, **kwargs):
+    def to_xarray(self, lazy=False, **kwargs):
         """
         Retrieve the OOI streams data and export to Xarray Datasets, saving in memory.
 
         Args:
-            **kwargs: Keyword arguments for xarray open_mfdataset.
+            lazy (bool, optional): Return a ``StreamHandle`` per stream instead of opened datasets.
+                Files are only listed, opened and merged, and raw EK60 files processed, when a handle is opened.
+                Defaults to False.
+            **kwargs: Keyword arguments for xarray open_mfdataset. \n
+                **max_workers** - maximum number of streams opened concurrently (Defaults to the OOI object ``max_workers``) \n
+                **catalog_cache** - set to true to persist the THREDDS catalogs on disk (Default is False) \n
+                **chunk_bytes** - target size in bytes of the chunks along the observation dimension, used when ``chunks`` is not given (Default is 64 MiB) \n
+                **begin_date** - only read data after this date, files outside of the time range are skipped (Default is None) \n
+                **end_date** - only read data before this date (Default is None) \n
+                **ek60_workers** - number of processes converting raw bio-acoustic sonar files (Defaults to the number of cores) \n
+                **ek60_params** - keyword arguments per EK60 processing step, e.g. ``{"get_MVBS": {"MVBS_ping_size": 30}}`` (Default is None) \n
+                **ek60_in_memory** - keep the intermediate EK60 Sv in memory and only write the MVBS netcdf (Default is True) \n
+                **use_cache** - reuse MVBS files processed earlier with the same raw file and parameters, from the local data cache (Default is True)
 
         Returns:
-            list: List of xarray datasets
+            list: List of xarray datasets, or of stream handles when ``lazy`` is set.
         """
-        ref_degs = self._filtered_data_catalog["reference_designator"].values
-        dataset_list = []
+        max_workers = kwargs.pop("max_workers", self._max_workers)
+        ek60_options = {
+            "max_workers": kwargs.pop("ek60_workers", None),
+            "params": kwargs.pop("ek60_params", None),
+            "in_memory": kwargs.pop("ek60_in_memory", True),
+            "cache": self._cache if kwargs.pop("use_cache", True) else None,
+        }
+        kwargs.setdefault("chunk_bytes", CHUNK_BYTES)
+        catalog_dir = None
+        if kwargs.pop("catalog_cache", False):
+            catalog_dir = os.path.join(
+                create_folder(self._source_name), "catalogs"
+            )
+        stream_handles = []
         if self._data_type == "netcdf":
-            if not self._cloud_source:
-                if self._raw_file_dict:
-                    mvbsnc_list = perform_ek60_processing(self._raw_file_dict)
-                    for k, v in mvbsnc_list.items():
-                        resdf = xr.open_mfdataset(
-                            v,
-                            concat_dim=["ping_time"],
-                            combine="nested",
-                            **kwargs,
-                        )
-                        resdf.attrs["id"] = k
-                        dataset_list.append(resdf)
-                turls = self._perform_check()
-
-                if len(turls) > 0:
-                    # TODO: Cache netcdf urls so that no need to re-request data
-                    self._netcdf_urls = [get_nc_urls(turl) for turl in turls]
-                    logger.info("Acquiring data from opendap urls ...")
-                    jobs = [
-                        gevent.spawn(fetch_xr, (url, ref_degs), **kwargs)
-                        for url in turls
-                    ]
-                    gevent.joinall(jobs, timeout=300)
-                    for job in jobs:
-                        dataset_list.append(job.value)
+            if self._cloud_source:
+                stream_handles = [
+                    handle.subset(
+                        begin_date=kwargs.get("begin_date"),
+                        end_date=kwargs.get("end_date"),
+                    )
+                    for handle in self._stream_handles
+                ]
+            else:
+                stream_handles = self._netcdf_stream_handles(
+                    catalog_dir, ek60_options, **kwargs
+                )
         else:
             self._logger.warning(
                 f"{self._data_type} cannot be converted to xarray dataset"
             )  # noqa
 
-        if dataset_list:
-            self._dataset_list = dataset_list
+        if lazy:
+            return stream_handles
+
+        if stream_handles:
+            logger.info("Acquiring data from opendap urls ...")
+            # Failed streams are logged by run_concurrently
+            self._dataset_list = [
+                ds
+                for ds in run_concurrently(
+                    StreamHandle.open,
+                    [(handle,) for handle in stream_handles],
+                    max_workers=max_workers,
+                    # EK60 processing has its own timeout
+                    timeout=None if self._raw_file_dict else 300,
+                )
+                if ds is not None
+            ]
 
         return self._dataset_list
 
+    def iter_datasets(self, timeout=300, **kwargs):
+        """
+        Open the OOI streams data concurrently, yielding each dataset as soon as it is opened.
+
+        Args:
+            timeout (int, optional): Seconds to wait for all streams to open. Defaults to 300.
+            **kwargs: Keyword arguments for ``to_xarray``.
+
+        Yields:
+            tuple: Stream key and xarray dataset, in the order streams finish opening.
+            Streams that fail or time out are logged and skipped.
+        """
+        max_workers = kwargs.pop("max_workers", self._max_workers)
+        stream_handles = self.to_xarray(lazy=True, **kwargs)
+        for (handle,), ds in iter_concurrently(
+            StreamHandle.open,
+            [(handle,) for handle in stream_handles],
+            max_workers=max_workers,
+            timeout=timeout,
+        ):
+            if ds is None:
+                logger.warning(f"{handle.key} has no data.")
+                continue
+            yield handle.key, ds
+
+    def to_zarr(self, store, timeout=3600, **kwargs):
+        """
+        Write the OOI streams data into a Zarr store, one consolidated group per stream key.
+
+        Streams already in the store are only read and appended from their
+        last stored time, so repeated requests for newer time windows extend
+        the store instead of rewriting it.
+
+        Args:
+            store (str or MutableMapping): Zarr store path or mapping.
+            timeout (int, optional): Seconds to wait for all streams to be written. Defaults to 3600.
+            **kwargs: Keyword arguments for ``to_xarray``. \n
+                **chunk_bytes** - target size in bytes of the zarr chunks along the time dimension (Default is 64 MiB)
+
+        Returns:
+            dict: Number of observations written per stream key.
+        """
+        max_workers = kwargs.pop("max_workers", self._max_workers)
+        chunk_bytes = kwargs.get("chunk_bytes", CHUNK_BYTES)
+        begin_dt = naive_datetime(kwargs.get("begin_date"))
+        stream_handles = []
+        for handle in self.to_xarray(lazy=True, **kwargs):
+            coverage = zarr_time_coverage(store, handle.key)
+            if coverage:
+                last_dt = pd.Timestamp(coverage[1]).floor("us")
+                if not begin_dt or last_dt > begin_dt:
+                    handle = handle.subset(begin_date=last_dt.isoformat())
+            stream_handles.append(handle)
+
+        written = {}
+        for (handle,), ds in iter_concurrently(
+            StreamHandle.open,
+            [(handle,) for handle in stream_handles],
+            max_workers=max_workers,
+            timeout=timeout,
+        ):
+            if ds is None:
+                continue
+            try:
+                written[handle.key] = write_zarr(
+                    ds, store, handle.key, chunk_bytes=chunk_bytes
+                )
+            except ValueError as e:
+                logger.error(f"{handle.key} not written to zarr: {e}")
+                continue
+            logger.info(
+                f"{handle.key}: {written[handle.key]} observations written to zarr"
+            )
+        return written
+
     def check_status(self):
         """ Function for user to manually check the status of the data """
         if not self._q.empty():
@@ -1033,6 +1323,58 @@ class OOI(CAVA):
             )
             return self
 
+    def _netcdf_stream_handles(
+        self, catalog_dir=None, ek60_options=None, **kwargs
+    ):
+        """ Create the stream handles of the finished netcdf requests """
+        if isinstance(self._filtered_data_catalog, pd.DataFrame):
+            ref_degs = self._filtered_data_catalog[
+                "reference_designator"
+            ].values
+        else:
+            # Resumed requests, e.g. 20180625T215711-RS03AXPS-SF03A-2A-CTDPFA302-streamed-ctdpf_sbe43_sample
+            ref_degs = [
+                "-".join(os.path.basename(rurl["allURLs"][1]).split("-")[1:5])
+                for rurl in self.raw()
+            ]
+        stream_handles = []
+        if self._raw_file_dict:
+            # Raw files are processed when a handle is opened
+            processing = EK60Processing(
+                self._raw_file_dict, **(ek60_options or {})
+            )
+            for k, v in self._raw_file_dict.items():
+                if any(v):
+                    stream_handles.append(
+                        StreamHandle(k, fetch_ek60, (k, processing), **kwargs)
+                    )
+        turls = self._perform_check()
+        for turl in turls:
+            # e.g. .../20180625T215711-RS03AXPS-SF03A-2A-CTDPFA302-streamed-ctdpf_sbe43_sample/catalog.html
+            stream_key = os.path.basename(os.path.dirname(turl)).split("-", 1)[
+                -1
+            ]
+            stream_handles.append(
+                StreamHandle(
+                    stream_key,
+                    fetch_xr,
+                    (turl, ref_degs),
+                    variables=self._stream_parameters(stream_key),
+                    cache_dir=catalog_dir,
+                    **kwargs,
+                )
+            )
+        return stream_handles
+
+    def _stream_parameters(self, stream_key):
+        """
+        Parameters selected by search for a stream key, e.g.
+        ``RS03AXPS-SF03A-2A-CTDPFA302-streamed-ctdpf_sbe43_sample``
+        """
+        if self._selected_parameters:
+            return self._selected_parameters.get(stream_key)
+        return None
+
     def _perform_check(self):
         """ Performing data status check every 10 seconds """
         turls = self.check_status()
@@ -1048,25 +1390,91 @@ class OOI(CAVA):
 
     def _prepare_download(self):
         """ Prepare netcdf download by parsing through the resulting raw urls """
-        import itertools
+        self._last_download_list = list(self._iter_download_list())
+        self._raise_listing_errors()
+        return self._last_download_list
+
+    def _raise_listing_errors(self):
+        """ Raise ConnectionError for the results whose listing failed or was empty """
+        failed = [
+            f"{durl} ({self._listing_errors[durl]})"
+            for durl in [rurl["allURLs"][1] for rurl in self.raw()]
+            if durl in self._listing_errors
+        ]
+        if failed:
+            raise ConnectionError(
+                f"Unable to list the files of {', '.join(failed)}"
+            )
+
+    def _iter_download_list(self, max_workers=None):
+        """
+        Yield netcdf download urls of the resulting raw urls as soon as
+        their directory listings are parsed. Listings are fetched
+        concurrently and remembered per status url once the request
+        completed, requests still compiling are listed again on the next
+        call. Listings that failed or were empty are not remembered either,
+        their error is kept in ``self._listing_errors``.
+        """
+        listed = Queue()
+
+        def list_download_urls(durl):
+            fname = "-".join(os.path.basename(durl).split("-")[1:])
+            nc_urls = []
+            try:
+                # Checked first, so no file is added after the listing
+                completed = self._request_completed(durl)
+                for nc_url in iter_download_urls(durl, session=self._session):
+                    nc_name = os.path.basename(nc_url)
+                    if fname in nc_name and "cal_" not in nc_name:
+                        nc_urls.append(nc_url)
+                        listed.put(nc_url)
+                if not nc_urls:
+                    raise ValueError("no netcdf files listed")
+                if completed:
+                    self._download_urls[durl] = nc_urls
+                self._listing_errors.pop(durl, None)
+            except Exception as e:
+                logger.error(f"Unable to list {durl}: {e}")
+                self._listing_errors[durl] = e
+            finally:
+                listed.put(None)
 
         download_urls = [rurl["allURLs"][1] for rurl in self.raw()]
-        download_list = []
         for durl in download_urls:
-            fname = "-".join(os.path.basename(durl).split("-")[1:])
-            nc_urls = get_download_urls(durl)
-            download_list.append(
-                list(
-                    filter(
-                        lambda x: (x.count(fname) > 1) and ("cal_" not in x),
-                        nc_urls,
-                    )
-                )
-            )
-        self._last_download_list = list(
-            itertools.chain.from_iterable(download_list)
-        )  # noqa
-        return self._last_download_list
+            yield from self._download_urls.get(durl, [])
+        unlisted = [
+            durl for durl in download_urls if durl not in self._download_urls
+        ]
+        if not unlisted:
+            return
+
+        with ThreadPoolExecutor(
+            max_workers=min(max_workers or self._max_workers, len(unlisted))
+        ) as executor:
+            for durl in unlisted:
+                executor.submit(list_download_urls, durl)
+            remaining = len(unlisted)
+            while remaining:
+                nc_url = listed.get()
+                if nc_url is None:
+                    remaining -= 1
+                else:
+                    yield nc_url
+
+    def _request_completed(self, status_url):
+        """ Check if a request finished compiling, in the journal or by looking for status.txt """
+        job = self._journal.find(status_url)
+        if job and job["status"] in ["completed", "downloaded"]:
+            return True
+        try:
+            req = self._session.get(f"{status_url}/status.txt", timeout=60)
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Unable to check {status_url}: {e}")
+            return False
+        if req.status_code != 200:
+            return False
+        self._journal.set_status(status_url, "completed")
+        return True
 
     def _check_data_status(self, data):
         """ Check if data is ready or not by looking for status.txt"""
@@ -1083,6 +1491,7 @@ class OOI(CAVA):
             print(text)  # noqa
             logger.info(text)  # noqa
             return None
+        self._journal.set_status(urls["status_url"], "completed")
         text = f'Request ({urls["status_url"]}) completed.'
         print(text)  # noqa
         logger.info(text)  # noqa
@@ -1103,34 +1512,60 @@ class OOI(CAVA):
         """ Function that perform task from queue """
         # when this exits, the print_lock is released
         with print_lock:
-            req = fetch_url(prepped_request=arg, session=self._session)
-            if req.json():
-                jsonres = req.json()
-                if "status_code" in jsonres:
-                    jsonres["request_url"] = req.url
-                self._raw_data.append(jsonres)
+            job = self._journal.get(arg.url) if self._resume else None
+            if job:
+                logger.info(f"Resuming request {job['status_url']}")
+                self._raw_data.append(job["response"])
+            else:
+                req = fetch_url(prepped_request=arg, session=self._session)
+                if req.json():
+                    jsonres = req.json()
+                    if "status_code" in jsonres:
+                        jsonres["request_url"] = req.url
+                    elif "allURLs" in jsonres:
+                        self._journal.record(arg.url, jsonres)
+                    self._raw_data.append(jsonres)
             logger.debug(arg)
 
+    def _perform_paginated_request(self, request_urls, **kwargs):
+        """ Fetch json requests page by page, one dataframe per stream """
+        for data_url, params in request_urls:
+            self._last_m2m_urls.append(
+                requests.Request("GET", data_url, params=params)
+                .prepare()
+                .url
+            )
+            datadf = fetch_json_pages(
+                data_url,
+                params,
+                auth=(self.ooi_username, self.ooi_token),
+                session=self._session,
+                **kwargs,
+            )
+            datadf.attrs["request_url"] = data_url
+            self._raw_data.append(datadf)
+
     def _perform_cloud_request(self, arg):
         """ Function that perform task from queue """
-        # when this exits, the print_lock is released
-        with print_lock:
-            selected, start_dt, end_dt = arg
-            total_ds = xr.merge(
-                [
-                    xr.open_zarr(store=s3fs.S3Map(sel.uri, s3=FILE_SYSTEM))
-                    for idx, sel in selected.iterrows()
-                ]
+        selected, start_dt, end_dt = arg
+        self._raw_data.append(selected)
+        # The zarr partitions are opened and combined by to_xarray
+        stream_key = os.path.basename(os.path.dirname(selected.iloc[0].uri))
+        self._stream_handles.append(
+            StreamHandle(
+                stream_key,
+                fetch_zarr,
+                selected.uri.tolist(),
+                variables=self._stream_parameters(stream_key),
+                fs=(
+                    self._chunk_cache.fs if self._chunk_cache else FILE_SYSTEM
+                ),
+                max_workers=self._max_workers,
+                begin_date=start_dt,
+                end_date=end_dt,
             )
-            self._raw_data.append(selected)
-            if len(total_ds.coords) > 0:
-                self._dataset_list.append(
-                    total_ds.sel(time=slice(start_dt, end_dt))
-                )
-            else:
-                message = f"{selected.iloc[0].uri} dates {start_dt} to {end_dt} is empty!"
-                logger.info(message)
-            logger.debug(selected)
+        )
+        logger.debug(selected)
 
     def _threader(self):
         """ Get job from the front of queue and pass to function """
@@ -1177,45 +1612,6 @@ class OOI(CAVA):
             self._rvocab = rvocab
         return pd.DataFrame(rvocab.json())
 
-    def _get_rawdata_filelist(self):
-        raw_data_url = {
-            "CE04OSPS-PC01B": "https://rawdata.oceanobservatories.org/files/CE04OSPS/PC01B/ZPLSCB102_10.33.10.143",
-            "CE02SHBP-MJ01C": "https://rawdata.oceanobservatories.org/files/CE02SHBP/MJ01C/ZPLSCB101_10.33.13.7",
-        }
-        raw_datadf = {}
-        for ref, raw_url in raw_data_url.items():
-            req = requests.get(raw_url)
-            if req.status_code == 200:
-                page = html_parser(req.content)
-            else:
-                page = req.status_code
-
-            if not isinstance(page, int):
-                files = [
-                    (
-                        datetime.datetime.strptime(
-                            a.get("href"), "OOI-D%Y%m%d-T%H%M%S.raw"
-                        ),
-                        a.get("href"),
-                    )
-                    for a in page.xpath(
-                        "//a[re:match(@href, '(\w)+\.raw')]",
-                        namespaces={
-                            "re": "http://exslt.org/regular-expressions"
-                        },
-                    )
-                ]
-
-                file_df = pd.DataFrame(
-                    files, columns=["datetime", "filename"]
-                ).set_index("datetime")
-
-                raw_datadf[ref] = file_df
-
-        self._raw_datadf = raw_datadf
-        self._raw_data_url = raw_data_url
-        return self._raw_datadf, self._raw_data_url
-
     def _get_data_catalog(self):
         """ Get Data Catalog """
         if self._current_data_catalog:
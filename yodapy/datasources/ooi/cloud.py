@@ -0,0 +1,466 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (
+    absolute_import,
+    division,
+    print_function,
+    unicode_literals,
+)
+
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+import s3fs
+import xarray as xr
+
+from fsspec import AbstractFileSystem
+
+from yodapy.utils.conn import MAX_WORKERS, run_concurrently
+from yodapy.utils.meta import create_folder
+from yodapy.utils.parser import variable_drops
+
+
+logger = logging.getLogger(__name__)
+
+FILE_SYSTEM = s3fs.S3FileSystem(anon=True)
+BUCKET_DATA = "io2data/data"
+
+CLOUD_FOLDER = "cloud"
+LISTING_FILE = "listing-{}.json"
+CHUNKS_FOLDER = "chunks"
+
+# Default zarr chunk cache size budget, in bytes
+DEFAULT_CHUNK_CACHE_SIZE = 5 * 1024 ** 3
+# Number of cache misses between two size budget checks
+EVICTION_INTERVAL = 256
+# Zarr metadata files, always read from the bucket
+ZARR_METADATA = {".zmetadata", ".zgroup", ".zarray", ".zattrs", "zarr.json"}
+
+# Seconds before a bucket listing is refreshed
+LISTING_TTL = 24 * 3600
+
+
+class CloudCatalog:
+    """Cached listing of the OOI cloud bucket.
+
+    The stream prefixes of the bucket and the time partitions of each
+    stream are listed once, kept in memory and saved to
+    ``~/.yodapy/<source>/cloud/listing-<key>.json``, one file per file system
+    protocol and bucket. Listings are refreshed once
+    they are older than ``ttl`` seconds. The partitions of a stream are
+    kept as a sorted datetime index, so selecting the partitions of a time
+    window is a binary search.
+
+    Args:
+        fs (s3fs.S3FileSystem, optional): File system of the bucket.
+        bucket (str, optional): Bucket path holding one prefix per stream.
+        ttl (int, optional): Listing time to live in seconds.
+        source_name (str, optional): Data source name.
+    """
+
+    def __init__(
+        self,
+        fs=FILE_SYSTEM,
+        bucket=BUCKET_DATA,
+        ttl=LISTING_TTL,
+        source_name="ooi",
+    ):
+        self.fs = fs
+        self.bucket = bucket
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._path = None
+        self._listing = {"streams": None, "partitions": {}}
+        self._indexes = {}
+
+        folder = create_folder(source_name)
+        if folder:
+            protocol = fs.protocol
+            if not isinstance(protocol, str):
+                protocol = protocol[0]
+            key = hashlib.sha1(f"{protocol}://{bucket}".encode()).hexdigest()
+            self._path = os.path.join(
+                folder, CLOUD_FOLDER, LISTING_FILE.format(key[:16])
+            )
+            self._listing = self._load()
+
+    def streams(self, refresh=False):
+        """
+        List the stream keys in the bucket.
+
+        Args:
+            refresh (bool, optional): List the bucket even if the cached listing is fresh.
+
+        Returns:
+            list: Stream keys, e.g. ``RS03AXPS-PC03A-4A-CTDPFA303-streamed-ctdpf_optode_sample``.
+        """
+        with self._lock:
+            entry = self._listing["streams"]
+            if refresh or self._expired(entry):
+                logger.debug(f"Listing {self.bucket}")
+                prefixes = self.fs.ls(self.bucket, detail=False, refresh=True)
+                entry = {
+                    "listed_at": time.time(),
+                    "keys": [os.path.basename(rd) for rd in prefixes],
+                }
+                self._listing["streams"] = entry
+                self._save()
+            return entry["keys"]
+
+    def partitions(self, stream_key, refresh=False):
+        """
+        Time partitions of a stream.
+
+        Args:
+            stream_key (str): Stream key.
+            refresh (bool, optional): List the stream even if the cached listing is fresh.
+
+        Returns:
+            pandas.Series: Partition uris indexed by their sorted start time.
+        """
+        with self._lock:
+            entry = self._listing["partitions"].get(stream_key)
+            if refresh or self._expired(entry):
+                prefix = "/".join([self.bucket, stream_key])
+                logger.debug(f"Listing {prefix}")
+                entry = {
+                    "listed_at": time.time(),
+                    "uris": self.fs.ls(prefix, detail=False, refresh=True),
+                }
+                self._listing["partitions"][stream_key] = entry
+                self._indexes.pop(stream_key, None)
+                self._save()
+            if stream_key not in self._indexes:
+                self._indexes[stream_key] = _partition_index(entry["uris"])
+            return self._indexes[stream_key]
+
+    def select(self, stream_key, begin_date=None, end_date=None):
+        """
+        Select the partitions of a stream that cover a time window.
+
+        Args:
+            stream_key (str): Stream key.
+            begin_date (str or datetime, optional): Window begin, open when None.
+            end_date (str or datetime, optional): Window end, open when None.
+
+        Returns:
+            pandas.DataFrame: Selected partitions, with ``uri`` and ``time`` columns.
+        """
+        index = self.partitions(stream_key)
+        start = 0
+        stop = len(index)
+        if begin_date is not None:
+            # The partition starting before the window may still cover it
+            start = max(
+                index.index.searchsorted(_naive(begin_date), "right") - 1, 0
+            )
+        if end_date is not None:
+            stop = index.index.searchsorted(_naive(end_date), "right")
+        selected = index.iloc[start:stop]
+        return pd.DataFrame({"uri": selected.values, "time": selected.index})
+
+    def clear(self):
+        """ Forget every listing """
+        with self._lock:
+            self._listing = {"streams": None, "partitions": {}}
+            self._indexes = {}
+            if self._path and os.path.exists(self._path):
+                os.unlink(self._path)
+
+    def _expired(self, entry):
+        return entry is None or time.time() - entry["listed_at"] > self.ttl
+
+    def _load(self):
+        if not os.path.exists(self._path):
+            return {"streams": None, "partitions": {}}
+        try:
+            with open(self._path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Unable to read cloud listing {self._path}: {e}")
+            return {"streams": None, "partitions": {}}
+
+    def _save(self):
+        if not self._path:
+            return
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        temp_path = f"{self._path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self._listing, f)
+        os.replace(temp_path, self._path)
+
+
+class _ChunkCacheFileSystem(AbstractFileSystem):
+    """ Read only file system serving the files of fs through a ChunkCache """
+
+    protocol = "chunkcache"
+
+    def __init__(self, fs, cache, **kwargs):
+        super().__init__(**kwargs)
+        self.fs = fs
+        self.cache = cache
+
+    def ls(self, path, detail=True, **kwargs):
+        return self.fs.ls(path, detail=detail, **kwargs)
+
+    def info(self, path, **kwargs):
+        return self.fs.info(path, **kwargs)
+
+    def cat_file(self, path, start=None, end=None, **kwargs):
+        return self.cache.read(self.fs, path)[start:end]
+
+    def _open(self, path, mode="rb", **kwargs):
+        if mode != "rb":
+            raise NotImplementedError("The chunk cache is read only")
+        return io.BytesIO(self.cat_file(path))
+
+
+class ChunkCache:
+    """Persistent local cache of the zarr chunks read from the OOI cloud bucket.
+
+    Every chunk read through ``fs`` is copied once to
+    ``~/.yodapy/<source>/cloud/chunks`` and read from local disk afterwards.
+    Zarr metadata is always read from the bucket and cached chunks are
+    keyed by the metadata of their partition, so appending to a partition
+    invalidates its chunks. Chunks are read from the bucket again once
+    they are older than ``ttl`` seconds, the bucket listing time to live.
+    Least recently used files are evicted once the cache grows past its
+    size budget.
+
+    Args:
+        fs (fsspec.AbstractFileSystem, optional): File system to cache.
+        max_bytes (int, optional): Cache size budget in bytes.
+        ttl (int, optional): Seconds a cached chunk is used.
+        source_name (str, optional): Data source name.
+    """
+
+    def __init__(
+        self,
+        fs=FILE_SYSTEM,
+        max_bytes=DEFAULT_CHUNK_CACHE_SIZE,
+        ttl=LISTING_TTL,
+        source_name="ooi",
+    ):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._versions = {}
+        self._path = None
+        self.fs = fs
+
+        folder = create_folder(source_name)
+        if folder:
+            self._path = os.path.join(folder, CLOUD_FOLDER, CHUNKS_FOLDER)
+            self.fs = _ChunkCacheFileSystem(
+                fs, self, skip_instance_cache=True
+            )
+            self.evict()
+
+    @property
+    def size(self):
+        """ Total size of the cached files in bytes """
+        return sum(size for _, size, _ in self._files())
+
+    def read(self, fs, path):
+        """
+        Read a file of fs, from the cache when it holds a fresh copy.
+
+        Args:
+            fs (fsspec.AbstractFileSystem): File system of the file.
+            path (str): File path.
+
+        Returns:
+            bytes: File content.
+        """
+        if not self._path:
+            return fs.cat_file(path)
+        folder, name = os.path.split(path)
+        if name in ZARR_METADATA:
+            data = fs.cat_file(path)
+            self._versions[folder] = hashlib.sha1(data).hexdigest()
+            return data
+
+        # Version of the closest metadata read for the chunk
+        version = ""
+        while folder and folder != os.path.dirname(folder):
+            if folder in self._versions:
+                version = self._versions[folder]
+                break
+            folder = os.path.dirname(folder)
+        key = hashlib.sha256(
+            f"{fs.protocol}:{path}:{version}".encode()
+        ).hexdigest()
+        cached_path = os.path.join(self._path, key)
+        try:
+            stat = os.stat(cached_path)
+            if time.time() - stat.st_mtime < self.ttl:
+                with open(cached_path, "rb") as f:
+                    data = f.read()
+                # Access time orders least recently used eviction
+                os.utime(cached_path, (time.time(), stat.st_mtime))
+                with self._lock:
+                    self._stats["hits"] += 1
+                return data
+        except FileNotFoundError:
+            pass
+
+        data = fs.cat_file(path)
+        os.makedirs(self._path, exist_ok=True)
+        temp_path = f"{cached_path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, cached_path)
+        with self._lock:
+            self._stats["misses"] += 1
+            misses = self._stats["misses"]
+        if misses % EVICTION_INTERVAL == 0:
+            self.evict()
+        return data
+
+    def cache_info(self):
+        """ Return cache statistics """
+        return {
+            "hits": self._stats["hits"],
+            "misses": self._stats["misses"],
+            "evictions": self._stats["evictions"],
+            "files": len(self._files()),
+            "size": self.size,
+            "max_bytes": self.max_bytes,
+            "path": self._path,
+        }
+
+    def evict(self):
+        """ Remove least recently used files until the cache fits its size budget """
+        with self._lock:
+            files = sorted(self._files(), key=lambda f: f[2])
+            total = sum(size for _, size, _ in files)
+            for path, size, _ in files:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    continue
+                total -= size
+                self._stats["evictions"] += 1
+
+    def clear(self):
+        """ Remove every cached file """
+        with self._lock:
+            for path, _, _ in self._files():
+                os.unlink(path)
+
+    def _files(self):
+        """ Path, size and last use of the cached files """
+        if not self._path or not os.path.exists(self._path):
+            return []
+        with os.scandir(self._path) as entries:
+            return [
+                (entry.path, stat.st_size, stat.st_atime)
+                for entry in entries
+                if entry.is_file() and not entry.name.endswith(".tmp")
+                for stat in [entry.stat()]
+            ]
+
+
+def open_partition(uri, fs=FILE_SYSTEM, variables=None, **kwargs):
+    """
+    Open one zarr partition, trimmed to a time window without reading data.
+
+    Args:
+        uri (str): Partition uri.
+        fs (fsspec.AbstractFileSystem, optional): File system of the partition.
+        variables (list, optional): Variables to keep, None for all.
+        **kwargs: ``begin_date`` and ``end_date`` of the window.
+
+    Returns:
+        xarray.Dataset: Trimmed partition, None when it has no data in the window.
+    """
+    store = fs.get_mapper(uri)
+    try:
+        ds = xr.open_zarr(store, consolidated=True)
+    except KeyError:
+        logger.debug(f"{uri} has no consolidated metadata")
+        ds = xr.open_zarr(store, consolidated=False)
+    if "time" not in ds.dims:
+        return None
+    ds = ds.sel(
+        time=slice(kwargs.get("begin_date"), kwargs.get("end_date"))
+    )
+    if ds.sizes["time"] == 0:
+        return None
+    if variables:
+        ds = ds.drop_vars(variable_drops(ds, variables), errors="ignore")
+    return ds
+
+
+def fetch_zarr(params, variables=None, **kwargs):
+    """
+    Open the zarr partitions of a cloud stream concurrently and concatenate them along time.
+
+    Args:
+        params (list): Partition uris, sorted by time.
+        variables (list, optional): Variables to keep, None for all.
+        **kwargs: ``fs`` file system, ``max_workers``, ``begin_date`` and ``end_date``.
+
+    Returns:
+        xarray.Dataset: Stream dataset, None when it has no data.
+    """
+    fs = kwargs.pop("fs", FILE_SYSTEM)
+    max_workers = kwargs.pop("max_workers", MAX_WORKERS)
+    begin_date = kwargs.pop("begin_date", None)
+    end_date = kwargs.pop("end_date", None)
+    datasets = [
+        ds
+        for ds in run_concurrently(
+            open_partition,
+            [(uri,) for uri in params],
+            max_workers=max_workers,
+            fs=fs,
+            variables=variables,
+            begin_date=begin_date,
+            end_date=end_date,
+        )
+        if ds is not None
+    ]
+    if not datasets:
+        logger.info(f"{params[0]} dates {begin_date} to {end_date} is empty!")
+        return None
+    datasets = sorted(datasets, key=lambda ds: ds.indexes["time"][0])
+    total_ds = xr.concat(
+        datasets,
+        dim="time",
+        data_vars="minimal",
+        coords="minimal",
+        compat="override",
+        join="outer",
+        combine_attrs="override",
+    )
+    # Partitions may share their boundary timestamps
+    return total_ds.isel(time=~total_ds.indexes["time"].duplicated())
+
+
+def _partition_index(uris):
+    """ Sorted series of partition uris indexed by the time in their name """
+    names = pd.Series([os.path.basename(uri) for uri in uris], dtype=object)
+    # Skip entries that are not partitions, e.g. consolidated metadata
+    is_partition = names.str.match(r"\d{4}").astype(bool).values
+    uris = pd.Series(list(uris), dtype=object)[is_partition]
+    times = pd.to_datetime(names[is_partition], errors="coerce")
+    index = pd.Series(uris.values, index=pd.DatetimeIndex(times), dtype=object)
+    return index[index.index.notna()].sort_index()
+
+
+def _naive(dt):
+    """ Timestamp in naive UTC, to compare with the partition times """
+    dt = pd.Timestamp(dt)
+    if dt.tzinfo:
+        dt = dt.tz_convert("UTC").tz_localize(None)
+    return dt
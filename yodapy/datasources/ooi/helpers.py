@@ -12,12 +12,16 @@ import os
 import threading
 
 import dask
-import gevent
 import pandas as pd
 import requests
 import xarray as xr
 
-from yodapy.utils.conn import requests_retry_session
+from yodapy.utils.conn import (
+    MAX_WORKERS,
+    requests_retry_session,
+    run_concurrently,
+    write_stream,
+)
 from yodapy.utils.parser import get_nc_urls
 
 
@@ -64,12 +68,8 @@ def preprocess_ds(ds):
 
 
 def write_nc(fname, r, folder):
-    with open(os.path.join(folder, fname), "wb") as f:
-        logger.info(f"Writing {fname}...")
-        # TODO: Add download progressbar?
-        for chunk in r.iter_content(chunk_size=1024):
-            if chunk:
-                f.write(chunk)
+    logger.info(f"Writing {fname}...")
+    write_stream(r, os.path.join(folder, fname))
     logger.info(f"{fname} successfully downloaded ---")
 
 
@@ -83,12 +83,15 @@ def download_nc(url, folder=os.path.curdir):
     return name
 
 
-def download_all_nc(turl, folder):
+def download_all_nc(turl, folder, max_workers=MAX_WORKERS):
     nc_urls = get_nc_urls(turl, download=True)
 
-    jobs = [gevent.spawn(download_nc, url, folder) for url in nc_urls]
-    gevent.joinall(jobs, timeout=300)
-    ncfiles = [job.value for job in jobs]
+    ncfiles = run_concurrently(
+        download_nc,
+        [(url, folder) for url in nc_urls],
+        max_workers=max_workers,
+        timeout=300,
+    )
     return ncfiles
 
 
@@ -0,0 +1,404 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (
+    absolute_import,
+    division,
+    print_function,
+    unicode_literals,
+)
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import pandas as pd
+import requests
+
+from yodapy.utils.conn import MAX_WORKERS, iter_concurrently
+from yodapy.utils.meta import create_folder
+from yodapy.utils.parser import naive_datetime
+
+
+logger = logging.getLogger(__name__)
+
+RAWDATA_FOLDER = "rawdata"
+INDEX_FILE = "index.json"
+REGISTRY_FILE = "registry.json"
+
+RAW_DATA_ROOT = "https://rawdata.oceanobservatories.org/files"
+# Known raw data folders, used until the server is crawled
+RAW_DATA_URLS = {
+    "CE04OSPS-PC01B-ZPLSCB102": f"{RAW_DATA_ROOT}/CE04OSPS/PC01B/ZPLSCB102_10.33.10.143",
+    "CE02SHBP-MJ01C-ZPLSCB101": f"{RAW_DATA_ROOT}/CE02SHBP/MJ01C/ZPLSCB101_10.33.13.7",
+}
+# Instrument classes whose data is retrieved as raw files
+RAW_INSTRUMENTS = ("ZPLSC",)
+
+# Folder levels below the root: site, node and instrument
+CRAWL_DEPTH = 3
+# Relative links to sub folders of a directory listing
+FOLDER_LINK = re.compile(r'href="([^"/?#.:][^"/?#:]*)/"')
+
+# Raw file names, e.g. OOI-D20180101-T000000.raw, and their links
+RAW_FILE_NAME = r"OOI-D(\d{8}-T\d{6})\.raw"
+RAW_FILE_LINK = re.compile(f'href="({RAW_FILE_NAME})"')
+RAW_FILE_TIME_FORMAT = "%Y%m%d-T%H%M%S"
+
+# Seconds before a directory listing is checked for new files
+LISTING_TTL = 3600
+# Seconds before the raw data server is crawled again
+REGISTRY_TTL = 7 * 24 * 3600
+# Seconds before a failed crawl is retried
+FAILED_CRAWL_TTL = 600
+
+
+def registry_key(reference_designator):
+    """
+    Registry key of an instrument, e.g. ``CE04OSPS-PC01B-ZPLSCB102`` for
+    ``CE04OSPS-PC01B-05-ZPLSCB102``.
+    """
+    parts = reference_designator.split("-")
+    if len(parts) < 4:
+        return None
+    return "-".join([parts[0], parts[1], parts[3]])
+
+
+class RawDataRegistry:
+    """Reference designators to raw data server folders.
+
+    The registry is built by crawling the raw data server, which keeps one
+    folder per site, node and instrument, e.g.
+    ``files/CE04OSPS/PC01B/ZPLSCB102_10.33.10.143``. Each level is listed
+    concurrently, down to ``depth`` levels below the root. The crawl is
+    saved to ``~/.yodapy/<source>/rawdata/registry.json`` and repeated once
+    it is older than ``ttl`` seconds. A crawl where any listing failed is
+    not used, the last complete crawl is kept instead, or the known folders
+    of ``RAW_DATA_URLS`` until a crawl completes. Failed crawls are retried
+    after ``retry_ttl`` seconds.
+
+    Args:
+        session (requests.Session, optional): Session used for listings.
+        root (str, optional): Raw data server root url.
+        depth (int, optional): Folder levels to crawl below the root.
+        ttl (int, optional): Crawl time to live in seconds.
+        retry_ttl (int, optional): Seconds before a failed crawl is retried.
+        max_workers (int, optional): Maximum number of concurrent listings.
+        source_name (str, optional): Data source name.
+    """
+
+    def __init__(
+        self,
+        session=None,
+        root=RAW_DATA_ROOT,
+        depth=CRAWL_DEPTH,
+        ttl=REGISTRY_TTL,
+        retry_ttl=FAILED_CRAWL_TTL,
+        max_workers=MAX_WORKERS,
+        source_name="ooi",
+    ):
+        self.session = session or requests.Session()
+        self.root = root.rstrip("/")
+        self.depth = depth
+        self.ttl = ttl
+        self.retry_ttl = retry_ttl
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._path = None
+        self._registry = None
+        self._failed_at = None
+
+        folder = create_folder(source_name)
+        if folder:
+            self._path = os.path.join(folder, RAWDATA_FOLDER, REGISTRY_FILE)
+            self._registry = self._load()
+
+    def folders(self, refresh=False):
+        """
+        Raw data folders by instrument.
+
+        Args:
+            refresh (bool, optional): Crawl the server even if the cached crawl is fresh.
+
+        Returns:
+            dict: Folder urls by registry key, e.g. ``CE04OSPS-PC01B-ZPLSCB102``.
+        """
+        with self._lock:
+            entry = self._registry
+            expired = (
+                entry is None or time.time() - entry["crawled_at"] > self.ttl
+            )
+            failed = (
+                self._failed_at is not None
+                and time.time() - self._failed_at < self.retry_ttl
+            )
+            if refresh or (expired and not failed):
+                try:
+                    folders = self.crawl()
+                except ConnectionError as e:
+                    logger.error(f"Raw data server crawl not used: {e}")
+                    folders = None
+                if folders:
+                    entry = {"crawled_at": time.time(), "folders": folders}
+                    self._registry = entry
+                    self._failed_at = None
+                    self._save()
+                else:
+                    self._failed_at = time.time()
+            if entry is None:
+                return dict(RAW_DATA_URLS)
+            return entry["folders"]
+
+    def lookup(self, reference_designator):
+        """
+        Raw data folder of an instrument.
+
+        Args:
+            reference_designator (str): Instrument reference designator, e.g. ``CE04OSPS-PC01B-05-ZPLSCB102``.
+
+        Returns:
+            str: Folder url, None when the instrument has no raw data folder.
+        """
+        return self.folders().get(registry_key(reference_designator))
+
+    def crawl(self):
+        """
+        List the raw data server down to the instrument folders.
+
+        Returns:
+            dict: Folder urls by registry key.
+
+        Raises:
+            ConnectionError: When a folder could not be listed.
+        """
+        start = time.time()
+        level = [(self.root,)]
+        for _ in range(self.depth - 1):
+            level = [
+                ("/".join([url, name]),)
+                for (url,), names in self._list_level(level)
+                for name in names
+            ]
+        folders = {}
+        for (url,), names in self._list_level(level):
+            site, node = url[len(self.root) + 1 :].split("/")[-2:]
+            for name in sorted(names):
+                # Instrument folders are named after the instrument and its address
+                key = "-".join([site, node, name.split("_")[0]])
+                folders.setdefault(key, "/".join([url, name]))
+        logger.info(
+            f"Found {len(folders)} raw data folders in {time.time() - start:.1f}s"
+        )
+        return folders
+
+    def clear(self):
+        """ Forget the crawl """
+        with self._lock:
+            self._registry = None
+            self._failed_at = None
+            if self._path and os.path.exists(self._path):
+                os.unlink(self._path)
+
+    def _list_level(self, level):
+        """ List the folders of a level, all listings must succeed """
+        listings = list(
+            iter_concurrently(self._list, level, max_workers=self.max_workers)
+        )
+        if len(listings) < len(level):
+            raise ConnectionError(
+                f"{len(level) - len(listings)} of {len(level)} folders "
+                "could not be listed"
+            )
+        return listings
+
+    def _list(self, url):
+        r = self.session.get(f"{url}/", timeout=60)
+        r.raise_for_status()
+        return FOLDER_LINK.findall(r.text)
+
+    def _load(self):
+        if not os.path.exists(self._path):
+            return None
+        try:
+            with open(self._path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Unable to read raw data registry {self._path}: {e}")
+            return None
+
+    def _save(self):
+        if not self._path:
+            return
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        temp_path = f"{self._path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self._registry, f)
+        os.replace(temp_path, self._path)
+
+
+class RawDataIndex:
+    """Cached index of the files in raw data server folders.
+
+    The raw file names of each folder are kept sorted, in memory and in
+    ``~/.yodapy/<source>/rawdata/index.json``. Once a listing is older than
+    ``ttl`` seconds, the folder is requested again with the validators of
+    the last listing, so an unchanged folder is not downloaded, and only
+    the files newer than the last indexed file are added. Files are
+    indexed by their start time, so selecting a time window is a binary
+    search.
+
+    Args:
+        session (requests.Session, optional): Session used for listings.
+        ttl (int, optional): Listing time to live in seconds.
+        source_name (str, optional): Data source name.
+    """
+
+    def __init__(self, session=None, ttl=LISTING_TTL, source_name="ooi"):
+        self.session = session or requests.Session()
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._path = None
+        self._listing = {}
+        self._indexes = {}
+
+        folder = create_folder(source_name)
+        if folder:
+            self._path = os.path.join(folder, RAWDATA_FOLDER, INDEX_FILE)
+            self._listing = self._load()
+
+    def files(self, url, refresh=False):
+        """
+        Raw files of a folder.
+
+        Args:
+            url (str): Raw data folder url.
+            refresh (bool, optional): Check the folder even if the cached listing is fresh.
+
+        Returns:
+            pandas.DataFrame: ``filename`` and ``urls`` columns, indexed by sorted file start time.
+        """
+        with self._lock:
+            entry = self._listing.get(url)
+            if refresh or entry is None or self._expired(entry):
+                if self._update(url, entry):
+                    self._indexes.pop(url, None)
+                entry = self._listing.get(url)
+            if entry is None:
+                return _file_index(url, [])
+            if url not in self._indexes:
+                self._indexes[url] = _file_index(url, entry["files"])
+            return self._indexes[url]
+
+    def select(self, url, begin_date=None, end_date=None):
+        """
+        Select the raw files of a folder that start within a time window.
+
+        Args:
+            url (str): Raw data folder url.
+            begin_date (str, optional): Window begin, open when None.
+            end_date (str, optional): Window end, open when None.
+
+        Returns:
+            pandas.DataFrame: Selected files, see ``files``.
+        """
+        index = self.files(url)
+        start = 0
+        stop = len(index)
+        if begin_date is not None:
+            start = index.index.searchsorted(naive_datetime(begin_date))
+        if end_date is not None:
+            stop = index.index.searchsorted(naive_datetime(end_date), "right")
+        return index.iloc[start:stop].copy()
+
+    def clear(self):
+        """ Forget every listing """
+        with self._lock:
+            self._listing = {}
+            self._indexes = {}
+            if self._path and os.path.exists(self._path):
+                os.unlink(self._path)
+
+    def _update(self, url, entry):
+        """ List a folder, returns True when new files were indexed """
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        logger.debug(f"Listing {url}")
+        try:
+            r = self.session.get(url, headers=headers, timeout=60)
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Unable to list {url}: {e}")
+            return False
+
+        if r.status_code == 304:
+            entry["listed_at"] = time.time()
+            self._save()
+            return False
+        if r.status_code != 200:
+            logger.error(f"Unable to list {url}: {r.status_code}")
+            return False
+
+        files = entry["files"] if entry is not None else []
+        # File names sort by start time, only look at the newer ones
+        last = files[-1] if files else ""
+        new_files = sorted(
+            {
+                name
+                for name, _ in RAW_FILE_LINK.findall(r.text)
+                if name > last
+            }
+        )
+        self._listing[url] = {
+            "listed_at": time.time(),
+            "etag": r.headers.get("ETag"),
+            "last_modified": r.headers.get("Last-Modified"),
+            "files": files + new_files,
+        }
+        self._save()
+        logger.debug(f"{len(new_files)} new files in {url}")
+        return len(new_files) > 0 or entry is None
+
+    def _expired(self, entry):
+        return time.time() - entry["listed_at"] > self.ttl
+
+    def _load(self):
+        if not os.path.exists(self._path):
+            return {}
+        try:
+            with open(self._path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Unable to read raw data index {self._path}: {e}")
+            return {}
+
+    def _save(self):
+        if not self._path:
+            return
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        temp_path = f"{self._path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self._listing, f)
+        os.replace(temp_path, self._path)
+
+
+def _file_index(url, files):
+    """ Index sorted raw file names by their start time """
+    stamps = pd.Series(files, dtype=object).str.extract(
+        RAW_FILE_NAME, expand=False
+    )
+    index = pd.DatetimeIndex(
+        pd.to_datetime(stamps, format=RAW_FILE_TIME_FORMAT), name="datetime"
+    )
+    return pd.DataFrame(
+        {
+            "filename": files,
+            "urls": ["/".join([url, f]) for f in files],
+        },
+        index=index,
+    )
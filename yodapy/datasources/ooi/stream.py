@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (
+    absolute_import,
+    division,
+    print_function,
+    unicode_literals,
+)
+
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+class StreamHandle:
+    """Lazy handle to the data of one instrument stream.
+
+    Nothing is listed, opened or merged until ``open`` is called, or a
+    variable is requested with ``handle[name]``. The dataset opened
+    without arguments is kept, subsets by variables or time are not.
+
+    Args:
+        key (str): Stream key, e.g. ``RS03AXPS-PC03A-4A-CTDPFA303-streamed-ctdpf_optode_sample``.
+        fetcher (callable): Function called as ``fetcher(params, variables, **kwargs)``
+            that returns an xarray dataset, e.g. ``yodapy.utils.conn.fetch_xr``.
+        params: Stream location passed to fetcher.
+        variables (list, optional): Variables to open by default, None for all.
+        **kwargs: Keyword arguments passed to fetcher.
+    """
+
+    def __init__(self, key, fetcher, params, variables=None, **kwargs):
+        self._key = key
+        self._fetcher = fetcher
+        self._params = params
+        self._variables = variables
+        self._kwargs = kwargs
+        self._dataset = None
+
+    def __repr__(self):
+        state = "opened" if self._dataset is not None else "not opened"
+        return f"<StreamHandle: {self._key} ({state})>"
+
+    def __getitem__(self, variable):
+        return self.open(variables=[variable])[variable]
+
+    @property
+    def key(self):
+        return self._key
+
+    @property
+    def variables(self):
+        return self._variables
+
+    def subset(self, variables=None, begin_date=None, end_date=None):
+        """
+        Restrict the handle to variables or a time range, without opening anything.
+
+        Args:
+            variables (list, optional): Variables to open. Defaults to the handle variables.
+            begin_date (str, optional): Only open data after this date in ISO-8601 Format.
+            end_date (str, optional): Only open data before this date in ISO-8601 Format.
+
+        Returns:
+            StreamHandle: New handle of the subset.
+        """
+        kwargs = dict(self._kwargs)
+        if begin_date:
+            kwargs["begin_date"] = begin_date
+        if end_date:
+            kwargs["end_date"] = end_date
+        return StreamHandle(
+            self._key,
+            self._fetcher,
+            self._params,
+            variables=variables or self._variables,
+            **kwargs,
+        )
+
+    def open(self, variables=None, begin_date=None, end_date=None):
+        """
+        Open the stream data.
+
+        Args:
+            variables (list, optional): Variables to open. Defaults to the handle variables.
+            begin_date (str, optional): Only open data after this date in ISO-8601 Format.
+            end_date (str, optional): Only open data before this date in ISO-8601 Format.
+
+        Returns:
+            xarray.Dataset: Stream dataset, None when the stream has no data.
+        """
+        if variables or begin_date or end_date:
+            return self.subset(variables, begin_date, end_date).open()
+        if self._dataset is None:
+            logger.debug(f"Opening {self._key}")
+            self._dataset = self._fetcher(
+                self._params, self._variables, **self._kwargs
+            )
+        return self._dataset
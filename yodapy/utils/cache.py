@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (
+    absolute_import,
+    division,
+    print_function,
+    unicode_literals,
+)
+
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from yodapy.utils.conn import file_checksum
+from yodapy.utils.meta import create_folder
+
+
+logger = logging.getLogger(__name__)
+
+CACHE_FOLDER = "cache"
+CACHE_INDEX = "index.json"
+
+# Default cache size budget, in bytes
+DEFAULT_CACHE_SIZE = 10 * 1024 ** 3
+# Seconds between index writes that only record access times
+INDEX_SAVE_INTERVAL = 60
+
+
+class DataCache:
+    """Content-addressed cache of downloaded data files.
+
+    Files are copied once under ``~/.yodapy/<source>/cache/objects`` by
+    their sha256 digest and indexed by the url they were downloaded from.
+    The same deployment file is served from a new results folder for every
+    data request, so files can instead be indexed by their name and the
+    normalized request that produced them, by passing the M2M request url
+    as ``request``. Least recently used files are evicted once the cache
+    grows past its size budget. Access times are saved at most every
+    ``INDEX_SAVE_INTERVAL`` seconds, or by ``flush``.
+
+    Args:
+        source_name (str): Data source name.
+        max_bytes (int): Cache size budget in bytes.
+    """
+
+    def __init__(self, source_name="ooi", max_bytes=DEFAULT_CACHE_SIZE):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._path = None
+        self._entries = {}
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._dirty = False
+        self._saved_at = 0
+
+        folder = create_folder(source_name)
+        if folder:
+            self._path = os.path.join(folder, CACHE_FOLDER)
+            self._entries = self._load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, url):
+        return self._find(url) is not None
+
+    @property
+    def size(self):
+        """ Total size of the cached files in bytes """
+        return sum(obj["size"] for obj in self._objects().values())
+
+    def get(self, url, request=None):
+        """
+        Look up a cached file.
+
+        Args:
+            url (str): Url the file was downloaded from.
+            request (str, optional): M2M request url that produced the file.
+
+        Returns:
+            str: Path of the cached file, None when it is not cached.
+        """
+        with self._lock:
+            key = self._find(_cache_key(url, request))
+            if key is None:
+                self._misses += 1
+                return None
+            entry = self._entries[key]
+            entry["last_access"] = time.time()
+            self._hits += 1
+            self._dirty = True
+            if time.time() - self._saved_at > INDEX_SAVE_INTERVAL:
+                self._save()
+            return self._object_path(entry["sha256"])
+
+    def put(self, url, path, request=None):
+        """
+        Add a downloaded file to the cache.
+
+        Args:
+            url (str): Url the file was downloaded from.
+            path (str): Path of the downloaded file.
+            request (str, optional): M2M request url that produced the file.
+
+        Returns:
+            str: Path of the cached file.
+        """
+        if not self._path:
+            return path
+        sha256 = file_checksum(path, algorithm="sha256")
+        object_path = self._object_path(sha256)
+        key = _cache_key(url, request)
+        with self._lock:
+            if not os.path.exists(object_path):
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                _copy(path, object_path)
+            previous = self._entries.get(key)
+            self._entries[key] = {
+                "name": os.path.basename(url),
+                "sha256": sha256,
+                "size": os.path.getsize(object_path),
+                "last_access": time.time(),
+            }
+            if previous and previous["sha256"] not in self._objects():
+                os.unlink(self._object_path(previous["sha256"]))
+            self._evict()
+            self._save()
+        return object_path
+
+    def export(self, url, destination, request=None, overwrite=False):
+        """
+        Copy a cached file to destination folder.
+
+        Args:
+            url (str): Url the file was downloaded from.
+            destination (str): Folder to place the file in.
+            request (str, optional): M2M request url that produced the file.
+            overwrite (bool, optional): Replace a file of the same name in destination.
+
+        Returns:
+            str: File name, None when the file is not cached.
+        """
+        object_path = self.get(url, request=request)
+        if not object_path:
+            return None
+        fname = os.path.basename(url)
+        target = os.path.join(destination, fname)
+        if overwrite or not os.path.exists(target):
+            _copy(object_path, target)
+        return fname
+
+    def flush(self):
+        """ Save the access times recorded since the last index write """
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+    def cache_info(self):
+        """ Return cache statistics """
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "evictions": self._evictions,
+            "entries": len(self._entries),
+            "files": len(self._objects()),
+            "size": self.size,
+            "max_bytes": self.max_bytes,
+            "path": self._path,
+        }
+
+    def clear(self):
+        """ Remove every cached file """
+        with self._lock:
+            self._entries = {}
+            self._dirty = False
+            if self._path and os.path.exists(self._path):
+                shutil.rmtree(self._path)
+
+    def _find(self, key):
+        if key in self._entries and os.path.exists(
+            self._object_path(self._entries[key]["sha256"])
+        ):
+            return key
+        return None
+
+    def _objects(self):
+        """ Cached files keyed by sha256, with their latest access """
+        objects = {}
+        for entry in self._entries.values():
+            obj = objects.setdefault(entry["sha256"], dict(entry))
+            obj["last_access"] = max(
+                obj["last_access"], entry["last_access"]
+            )
+        return objects
+
+    def _evict(self):
+        objects = sorted(
+            self._objects().values(), key=lambda obj: obj["last_access"]
+        )
+        total = sum(obj["size"] for obj in objects)
+        for obj in objects:
+            if total <= self.max_bytes:
+                break
+            logger.debug(f"Evicting {obj['name']} from cache")
+            os.unlink(self._object_path(obj["sha256"]))
+            self._entries = {
+                k: v
+                for k, v in self._entries.items()
+                if v["sha256"] != obj["sha256"]
+            }
+            total -= obj["size"]
+            self._evictions += 1
+
+    def _object_path(self, sha256):
+        return os.path.join(self._path, "objects", sha256[:2], sha256)
+
+    def _load(self):
+        index_path = os.path.join(self._path, CACHE_INDEX)
+        if not os.path.exists(index_path):
+            return {}
+        try:
+            with open(index_path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Unable to read cache index {index_path}: {e}")
+            return {}
+
+    def _save(self):
+        if not self._path:
+            return
+        os.makedirs(self._path, exist_ok=True)
+        index_path = os.path.join(self._path, CACHE_INDEX)
+        with open(f"{index_path}.tmp", "w") as f:
+            json.dump(self._entries, f)
+        os.replace(f"{index_path}.tmp", index_path)
+        self._dirty = False
+        self._saved_at = time.time()
+
+
+def _cache_key(url, request=None):
+    """ Index key of a file, by url or by name and normalized request """
+    if not request:
+        return url
+    parts = urlsplit(request)
+    query = urlencode(sorted(parse_qsl(parts.query)))
+    return f"{parts.netloc}{parts.path}?{query}#{os.path.basename(url)}"
+
+
+def _copy(src, dst):
+    """ Copy src to dst, never sharing the cached file with the user """
+    temp_path = f"{dst}.tmp"
+    shutil.copyfile(src, temp_path)
+    os.replace(temp_path, dst)
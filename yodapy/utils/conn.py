@@ -8,30 +8,75 @@ from __future__ import (
 )
 
 import datetime
-import gc
+import hashlib
+import json
 import logging
 import os
-import re
+import threading
+import time
 
-import gevent
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    TimeoutError,
+    as_completed,
+    wait,
+)
+
+import numpy as np
+import pandas as pd
 import pytz
 import requests
+import urllib3
 import xarray as xr
 
+import echopype
+
 from dateutil import parser
 from echopype.convert import ConvertEK60
-from lxml import html
+from lxml import etree
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
 from yodapy.utils.meta import create_folder
-from yodapy.utils.parser import get_nc_urls
+from yodapy.utils.parser import (
+    CHUNK_BYTES,
+    auto_chunks,
+    datetime_to_string,
+    filter_time_coverage,
+    get_nc_urls,
+    naive_datetime,
+    split_time_range,
+    time_slicer,
+    variable_drops,
+)
 
 
 from echopype.model import EchoData
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of data points M2M returns for a json request
+M2M_JSON_LIMIT = 20000
+
+# Default number of concurrent workers
+MAX_WORKERS = 10
+
+# Buffer size of streamed downloads, in bytes
+DOWNLOAD_BUFFER_SIZE = 8 * 1024 * 1024
+
+# Target size and maximum count of byte range segments of a download
+SEGMENT_SIZE = 64 * 1024 * 1024
+MAX_SEGMENTS = 8
+
+# File signatures of netcdf3 (classic, 64-bit offset, 64-bit data) and netcdf4
+NETCDF3_SIGNATURE = b"CDF"
+HDF5_SIGNATURE = b"\x89HDF\r\n\x1a\n"
+
+# Time variables of stream datasets, MVBS datasets are indexed by ping time
+TIME_VARIABLES = ("time", "ping_time")
+
 
 def requests_retry_session(
     retries=10,
@@ -75,79 +120,464 @@ def fetch_url(
         return r
 
 
-# --- OOI Data Source Specific connection methods ---
-def get_download_urls(url):
-    r = requests.get(url)
-    tree = html.fromstring(r.content)
-    # Only get netCDF
-    nc_list = list(
-        filter(
-            lambda x: re.match(r"(.*?.nc$)", x.attrib["href"]) is not None,
-            tree.xpath('//*[contains(@href, ".nc")]'),
+def run_concurrently(
+    func,
+    args_list,
+    max_workers=MAX_WORKERS,
+    timeout=None,
+    processes=False,
+    **kwargs,
+):
+    """
+    Run func for every argument tuple on a thread or process pool.
+
+    Args:
+        func (callable): Function to run, must be picklable when ``processes`` is set.
+        args_list (iterable): Argument tuples for func, a list or a generator.
+        max_workers (int, optional): Maximum number of concurrent workers.
+        timeout (int, optional): Seconds to wait for all calls to finish.
+        processes (bool, optional): Run on a process pool, for CPU bound work.
+        **kwargs: Keyword arguments passed to every call of func.
+
+    Returns:
+        list: Results in the order of args_list, None for calls that
+        raised or did not finish within timeout.
+    """
+    if hasattr(args_list, "__len__"):
+        if not args_list:
+            return []
+        max_workers = min(max_workers, len(args_list))
+    executor_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    executor = executor_class(max_workers=max_workers)
+    # args_list may be a generator, calls start as its items arrive
+    submitted = [
+        (args, executor.submit(func, *args, **kwargs)) for args in args_list
+    ]
+    done, not_done = wait([future for _, future in submitted], timeout=timeout)
+    for future in not_done:
+        future.cancel()
+    executor.shutdown(wait=not not_done)
+
+    results = []
+    for args, future in submitted:
+        if future in not_done:
+            logger.error(f"{func.__name__}{args} timed out after {timeout}s")
+            results.append(None)
+        elif future.exception():
+            logger.error(f"{func.__name__}{args} failed: {future.exception()}")
+            results.append(None)
+        else:
+            results.append(future.result())
+    return results
+
+
+def iter_concurrently(
+    func, args_list, max_workers=MAX_WORKERS, timeout=None, **kwargs
+):
+    """
+    Run func for every argument tuple on a thread pool, yielding results as calls finish.
+
+    Args:
+        func (callable): Function to run.
+        args_list (iterable): Argument tuples for func.
+        max_workers (int, optional): Maximum number of concurrent workers.
+        timeout (int, optional): Seconds to wait for all calls to finish.
+        **kwargs: Keyword arguments passed to every call of func.
+
+    Yields:
+        tuple: Argument tuple and result, in the order calls finish.
+        Calls that raised or did not finish within timeout are logged and skipped.
+    """
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    futures = {
+        executor.submit(func, *args, **kwargs): args for args in args_list
+    }
+    try:
+        for future in as_completed(futures, timeout=timeout):
+            args = futures[future]
+            if future.exception():
+                logger.error(
+                    f"{func.__name__}{args} failed: {future.exception()}"
+                )
+            else:
+                yield args, future.result()
+    except TimeoutError:
+        for future, args in futures.items():
+            if not future.done():
+                logger.error(
+                    f"{func.__name__}{args} timed out after {timeout}s"
+                )
+    finally:
+        # Also reached when the caller stops iterating early
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+def copy_stream(r, f, buffer_size=DOWNLOAD_BUFFER_SIZE):
+    """ Copy a response body into an open file through one preallocated buffer """
+    buffer = memoryview(bytearray(buffer_size))
+    r.raw.decode_content = True
+
+    written = 0
+    while True:
+        nbytes = r.raw.readinto(buffer)
+        if not nbytes:
+            break
+        f.write(buffer[:nbytes])
+        written += nbytes
+    return written
+
+
+def write_stream(
+    r, path, resume=False, expected_size=-1, buffer_size=DOWNLOAD_BUFFER_SIZE
+):
+    """
+    Stream a response body to a file through one preallocated buffer.
+
+    The body is read straight into the buffer and written to
+    ``<path>.part``, which is renamed to ``path`` once complete.
+
+    Args:
+        r (requests.Response): Response opened with ``stream=True``.
+        path (str): Destination file path.
+        resume (bool, optional): Append to an existing ``.part`` file.
+        expected_size (int, optional): Expected size of the complete file.
+            A mismatch raises ValueError and keeps the ``.part`` file to resume.
+        buffer_size (int, optional): Read buffer size in bytes.
+
+    Returns:
+        int: Number of bytes written.
+    """
+    temp_path = f"{path}.part"
+    with open(temp_path, "ab" if resume else "wb") as f:
+        written = copy_stream(r, f, buffer_size=buffer_size)
+
+    size = os.path.getsize(temp_path)
+    if expected_size >= 0 and size != expected_size:
+        raise ValueError(
+            f"{os.path.basename(path)} is incomplete: {size} of {expected_size} bytes"
         )
+    os.replace(temp_path, path)
+    return written
+
+
+# --- OOI Data Source Specific connection methods ---
+def iter_download_urls(url, session=None, chunk_size=64 * 1024):
+    """
+    Lazily yield the netcdf urls of a results directory listing,
+    parsing the html page incrementally as it is downloaded.
+    """
+    session = session or requests.Session()
+    r = fetch_url(
+        requests.Request("GET", url).prepare(), session=session, stream=True
     )
-    return ["/".join([url, nc.attrib["href"]]) for nc in nc_list]
+    r.raise_for_status()
+    html_parser = etree.HTMLPullParser(events=("start",), tag="a")
+
+    def parsed_urls():
+        for _, element in html_parser.read_events():
+            href = element.get("href")
+            # Only get netCDF
+            if href and href.endswith(".nc"):
+                yield "/".join([url, href])
+
+    for chunk in r.iter_content(chunk_size=chunk_size):
+        html_parser.feed(chunk)
+        yield from parsed_urls()
+    html_parser.close()
+    yield from parsed_urls()
+
+
+def get_download_urls(url, session=None):
+    return list(iter_download_urls(url, session=session))
+
+
+def is_netcdf(path):
+    """ Check the file signature of a netcdf3 or netcdf4/hdf5 file """
+    with open(path, "rb") as f:
+        header = f.read(len(HDF5_SIGNATURE))
+    return header.startswith(NETCDF3_SIGNATURE) or header == HDF5_SIGNATURE
 
 
-def download_url(url, data_fold, session):
-    """ Perform download and check netcdf download url """
-    ds = None
-    while ds is None:
+def file_checksum(path, algorithm="md5", chunk_size=1024 * 1024):
+    """ Compute the hex digest of a file """
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def validate_nc(path, checksum=None, algorithm="md5"):
+    """ Validate a downloaded netcdf by its signature and optional checksum """
+    if not is_netcdf(path):
+        raise ValueError(f"{os.path.basename(path)} is not a netcdf file")
+    if checksum and file_checksum(path, algorithm) != checksum.lower():
+        raise ValueError(f"{os.path.basename(path)} checksum mismatch")
+
+
+def download_url(
+    url,
+    data_fold,
+    session,
+    retries=5,
+    backoff_factor=1,
+    checksum=None,
+    buffer_size=DOWNLOAD_BUFFER_SIZE,
+    segments=1,
+    validate=validate_nc,
+):
+    """
+    Perform download and check netcdf download url.
+
+    Failed attempts are retried with exponential backoff, resuming
+    from the partially downloaded file.
+
+    Args:
+        url (str): Netcdf download url.
+        data_fold (str): Folder to save the netcdf in.
+        session (requests.Session): Session to download with.
+        retries (int, optional): Maximum number of download attempts.
+        backoff_factor (float, optional): Seconds to wait before the second attempt,
+            doubled for every attempt after.
+        checksum (str, optional): Expected md5 hex digest of the file.
+        buffer_size (int, optional): Download buffer size in bytes.
+        segments (int or str, optional): Number of byte ranges downloaded concurrently,
+            'auto' to choose from the file size.
+        validate (callable, optional): Called with the file path and checksum,
+            raises ValueError for an invalid file. None to skip validation.
+
+    Returns:
+        str: Netcdf file name, None if every attempt failed.
+    """
+    for attempt in range(1, retries + 1):
         try:
-            fname = download_nc(url, folder=data_fold)
-            if fname:
+            if segments == 1:
+                fname = download_nc(
+                    url,
+                    session=session,
+                    folder=data_fold,
+                    buffer_size=buffer_size,
+                )
+            else:
+                fname = download_segmented(
+                    url,
+                    session=session,
+                    folder=data_fold,
+                    segments=None if segments == "auto" else segments,
+                    buffer_size=buffer_size,
+                )
+            if validate:
                 logger.info(f"--- Checking {fname} ---")
-                ds = xr.open_dataset(os.path.join(data_fold, fname))
-                if isinstance(ds, xr.Dataset):
-                    logger.info(f"--- Checks passed for {fname} ---")
-        except Exception:
-            pass
-    del ds
-    gc.collect()
-    return fname
-
-
-def download_nc(url, session=None, folder=os.path.curdir):
-    """ Prepare request for download and write to netcdf once downloaded """
+                try:
+                    validate(os.path.join(data_fold, fname), checksum=checksum)
+                except ValueError:
+                    os.unlink(os.path.join(data_fold, fname))
+                    raise
+                logger.info(f"--- Checks passed for {fname} ---")
+            return fname
+        except (
+            requests.RequestException,
+            urllib3.exceptions.HTTPError,
+            OSError,
+            ValueError,
+        ) as e:
+            logger.warning(
+                f"Download attempt {attempt}/{retries} of {url} failed: {e}"
+            )
+            if attempt < retries:
+                time.sleep(backoff_factor * 2 ** (attempt - 1))
+    logger.error(f"Unable to download {url} after {retries} attempts.")
+    return None
+
+
+def download_nc(
+    url,
+    session=None,
+    folder=os.path.curdir,
+    buffer_size=DOWNLOAD_BUFFER_SIZE,
+):
+    """
+    Prepare request for download and write to netcdf once downloaded.
+
+    The file is written to a ``.part`` file first, which is resumed with
+    a HTTP Range request when it exists, and only renamed once its size
+    matches the size advertised by the server.
+    """
     session = session or requests.Session()
     name = os.path.basename(url)
+    path = os.path.join(folder, name)
+    part_path = f"{path}.part"
+
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
 
     logger.info(f"Downloading {name}...")
-    r = requests.Request("GET", url)
+    r = requests.Request("GET", url, headers=headers)
     prepped = r.prepare()
     rncdownload = fetch_url(prepped, session=session, stream=True)
 
-    write_nc(name, rncdownload, folder)
+    if rncdownload.status_code == 416:
+        # Partial file is larger than the remote file, start over.
+        os.unlink(part_path)
+        raise ValueError(f"{name}.part does not match {url}")
+    rncdownload.raise_for_status()
+
+    resume = rncdownload.status_code == 206
+    if resume:
+        logger.info(f"Resuming {name} from byte {offset}...")
+        expected_size = int(
+            rncdownload.headers["Content-Range"].split("/")[-1]
+        )
+    else:
+        expected_size = int(rncdownload.headers.get("Content-Length", -1))
+    if "Content-Encoding" in rncdownload.headers:
+        # Content-Length is the size of the encoded content
+        expected_size = -1
+
+    logger.info(f"Writing {name}...")
+    write_stream(
+        rncdownload,
+        path,
+        resume=resume,
+        expected_size=expected_size,
+        buffer_size=buffer_size,
+    )
+    logger.info(f"{name} successfully downloaded ---")
+
+    return name
+
+
+def segment_count(size, segment_size=SEGMENT_SIZE, max_segments=MAX_SEGMENTS):
+    """ Number of byte range segments to download a file of size with """
+    return max(1, min(max_segments, -(-size // segment_size)))
+
+
+def download_segmented(
+    url,
+    session=None,
+    folder=os.path.curdir,
+    segments=None,
+    buffer_size=DOWNLOAD_BUFFER_SIZE,
+):
+    """
+    Download a file as byte range segments fetched concurrently and
+    written in place into one preallocated file.
+
+    Falls back to ``download_nc`` when the server does not advertise
+    ``Accept-Ranges: bytes`` or a single segment is enough.
+
+    Args:
+        url (str): Download url.
+        session (requests.Session, optional): Session shared by the segments.
+        folder (str, optional): Folder to save the file in.
+        segments (int, optional): Number of segments, chosen from the file size by default.
+        buffer_size (int, optional): Download buffer size in bytes.
+
+    Returns:
+        str: Downloaded file name.
+    """
+    session = session or requests.Session()
+    name = os.path.basename(url)
+    path = os.path.join(folder, name)
+    part_path = f"{path}.part"
+
+    head = fetch_url(
+        requests.Request("HEAD", url).prepare(),
+        session=session,
+        allow_redirects=True,
+    )
+    size = int(head.headers.get("Content-Length", -1))
+    if (
+        head.status_code != 200
+        or head.headers.get("Accept-Ranges", "none").lower() != "bytes"
+        or "Content-Encoding" in head.headers
+        or size <= 0
+    ):
+        logger.debug(f"{name} does not support byte ranges.")
+        return download_nc(
+            url, session=session, folder=folder, buffer_size=buffer_size
+        )
+
+    segments = min(segments or segment_count(size), size)
+    if segments == 1:
+        return download_nc(
+            url, session=session, folder=folder, buffer_size=buffer_size
+        )
+
+    def fetch_segment(bounds):
+        start, end = bounds
+        r = fetch_url(
+            requests.Request(
+                "GET", url, headers={"Range": f"bytes={start}-{end}"}
+            ).prepare(),
+            session=session,
+            stream=True,
+        )
+        if r.status_code != 206:
+            raise ValueError(f"{name} byte range {start}-{end} not served")
+        with open(part_path, "r+b") as f:
+            f.seek(start)
+            written = copy_stream(r, f, buffer_size=buffer_size)
+        if written != end - start + 1:
+            raise ValueError(f"{name} byte range {start}-{end} is incomplete")
+
+    logger.info(f"Downloading {name} in {segments} segments...")
+    with open(part_path, "wb") as f:
+        f.truncate(size)
+    edges = [size * i // segments for i in range(segments + 1)]
+    try:
+        with ThreadPoolExecutor(max_workers=segments) as executor:
+            list(
+                executor.map(
+                    fetch_segment,
+                    [(a, b - 1) for a, b in zip(edges[:-1], edges[1:])],
+                )
+            )
+    except Exception:
+        # Preallocated segments can't be resumed by download_nc
+        os.unlink(part_path)
+        raise
+    os.replace(part_path, path)
+    logger.info(f"{name} successfully downloaded ---")
 
     return name
 
 
-def write_nc(fname, r, folder):
+def write_nc(fname, r, folder, buffer_size=DOWNLOAD_BUFFER_SIZE):
     """ Write to netcdf whatever netcdf url we got """
-    with open(os.path.join(folder, fname), "wb") as f:
-        logger.info(f"Writing {fname}...")
-        # TODO: Add download progressbar?
-        for chunk in r.iter_content(chunk_size=1024):
-            if chunk:
-                f.write(chunk)
+    logger.info(f"Writing {fname}...")
+    write_stream(r, os.path.join(folder, fname), buffer_size=buffer_size)
     logger.info(f"{fname} successfully downloaded ---")
 
 
-def fetch_xr(params, **kwargs):
+def fetch_xr(params, variables=None, **kwargs):
+    """
+    Open the netcdfs of a THREDDS catalog as one dataset.
+
+    Unless ``chunks`` is given, files are chunked along the observation
+    dimension into chunks of about ``chunk_bytes`` (64 MiB by default),
+    based on the dimension length and variable dtypes of the first file.
+    When ``variables`` is given, every other variable except coordinates
+    is dropped before it is read or decoded. When ``begin_date`` or
+    ``end_date`` is given, files outside of the time range are skipped
+    and the others are sliced to it before any other data is read.
+    """
     turl, ref_degs = params
-    if kwargs.get("cloud_source"):
+    chunk_bytes = kwargs.pop("chunk_bytes", CHUNK_BYTES)
+    begin_date = kwargs.pop("begin_date", None)
+    end_date = kwargs.pop("end_date", None)
+    cache_dir = kwargs.pop("cache_dir", None)
+    if kwargs.pop("cloud_source", False):
         filt_ds = get_nc_urls(
             turl,
             cloud_source=True,
-            begin_date=kwargs.get("begin_date"),
-            end_date=kwargs.get("end_date"),
+            begin_date=begin_date,
+            end_date=end_date,
         )
-        # cleanup kwargs
-        kwargs.pop("begin_date")
-        kwargs.pop("end_date")
-        kwargs.pop("cloud_source")
     else:
-        datasets = get_nc_urls(turl)
+        datasets = get_nc_urls(turl, cache_dir=cache_dir)
         # only include instruments where ref_deg appears twice (i.e. was in original filter)
         filt_ds = list(
             filter(
@@ -155,10 +585,202 @@ def fetch_xr(params, **kwargs):
             )
         )
 
-    # TODO: Place some chunking here
+    if begin_date or end_date:
+        begin_dt = naive_datetime(begin_date)
+        end_dt = naive_datetime(end_date)
+        filt_ds = filter_time_coverage(filt_ds, begin_dt, end_dt)
+        if not filt_ds:
+            raise ValueError(
+                f"No data in {turl} between {begin_date} and {end_date}"
+            )
+        kwargs["preprocess"] = time_slicer(
+            begin_dt, end_dt, preprocess=kwargs.get("preprocess")
+        )
+
+    if filt_ds and ("chunks" not in kwargs or variables):
+        with xr.open_dataset(
+            filt_ds[0], engine="netcdf4", decode_cf=False
+        ) as first_ds:
+            if variables:
+                kwargs["drop_variables"] = list(
+                    kwargs.get("drop_variables", [])
+                ) + variable_drops(first_ds, variables)
+                first_ds = first_ds.drop_vars(
+                    kwargs["drop_variables"], errors="ignore"
+                )
+            if "chunks" not in kwargs:
+                kwargs["chunks"] = auto_chunks(
+                    first_ds, target_bytes=chunk_bytes
+                )
+        logger.debug(f"Chunking {turl} with {kwargs['chunks']}")
+
     return xr.open_mfdataset(filt_ds, engine="netcdf4", **kwargs)
 
 
+def fetch_mvbs(params, variables=None, **kwargs):
+    """
+    Open the processed MVBS netcdfs of a bio-acoustic sonar stream.
+
+    Args:
+        params (tuple): Stream key and list of MVBS netcdf paths.
+        variables (list, optional): Variables to keep, None for all.
+        **kwargs: ``begin_date``, ``end_date`` and keyword arguments for xarray open_mfdataset.
+
+    Returns:
+        xarray.Dataset: MVBS dataset.
+    """
+    key, files = params
+    begin_date = kwargs.pop("begin_date", None)
+    end_date = kwargs.pop("end_date", None)
+    kwargs.pop("chunk_bytes", None)
+    resdf = xr.open_mfdataset(
+        files, concat_dim=["ping_time"], combine="nested", **kwargs
+    )
+    if variables:
+        resdf = resdf[[v for v in variables if v in resdf]]
+    if begin_date or end_date:
+        resdf = resdf.sel(
+            ping_time=slice(
+                naive_datetime(begin_date), naive_datetime(end_date)
+            )
+        )
+    resdf.attrs["id"] = key
+    return resdf
+
+
+def fetch_ek60(params, variables=None, **kwargs):
+    """
+    Process the raw EK60 files of a bio-acoustic sonar stream and open the MVBS netcdfs.
+
+    Args:
+        params (tuple): Stream key and ``EK60Processing`` of the raw files, so the
+            files are only processed once the stream is opened.
+        variables (list, optional): Variables to keep, None for all.
+        **kwargs: Keyword arguments for ``fetch_mvbs``.
+
+    Returns:
+        xarray.Dataset: MVBS dataset, None when no raw file could be processed.
+    """
+    key, processing = params
+    files = processing.get(key)
+    if not files:
+        logger.info(f"{key} has no processed MVBS files!")
+        return None
+    return fetch_mvbs((key, files), variables, **kwargs)
+
+
+def time_variable(ds):
+    """
+    Name of the time variable of a stream dataset.
+
+    Args:
+        ds (xarray.Dataset): Stream dataset.
+
+    Returns:
+        str: ``time``, or ``ping_time`` for MVBS datasets, None when the dataset has neither.
+    """
+    for name in TIME_VARIABLES:
+        if name in ds.variables:
+            return name
+    return None
+
+
+def zarr_time_coverage(store, group):
+    """
+    Read the time coverage of a stream group in a Zarr store.
+
+    Args:
+        store (str or MutableMapping): Zarr store path or mapping.
+        group (str): Stream group name.
+
+    Returns:
+        tuple: First and last time as numpy datetime64, None when the group does not exist.
+    """
+    try:
+        ds = xr.open_zarr(store, group=group, consolidated=True)
+    except (FileNotFoundError, KeyError, ValueError):
+        return None
+    name = time_variable(ds)
+    if name is None:
+        return None
+    times = ds[name]
+    if times.size == 0:
+        return None
+    dim = times.dims[0]
+    return (
+        times.isel({dim: 0}).values,
+        times.isel({dim: -1}).values,
+    )
+
+
+def write_zarr(ds, store, group, chunk_bytes=CHUNK_BYTES):
+    """
+    Write a stream dataset into a consolidated group of a Zarr store.
+
+    New groups are chunked along the time dimension, ``time`` or
+    ``ping_time`` for MVBS datasets, into chunks of about
+    ``chunk_bytes``. When the group exists, only the observations newer
+    than its last time are appended, rechunked so that they continue the
+    partial last chunk of the store.
+
+    Args:
+        ds (xarray.Dataset): Stream dataset with a time variable.
+        store (str or MutableMapping): Zarr store path or mapping.
+        group (str): Stream group name, e.g. the stream key.
+        chunk_bytes (int, optional): Target chunk size in bytes.
+
+    Returns:
+        int: Number of observations written.
+
+    Raises:
+        ValueError: When the dataset has no time variable.
+    """
+    name = time_variable(ds)
+    if name is None:
+        raise ValueError(f"{group} has no time variable")
+    dim = ds[name].dims[0]
+    coverage = zarr_time_coverage(store, group)
+    if coverage:
+        times = ds[name].values
+        ds = ds.isel({dim: np.flatnonzero(times > coverage[1])})
+        if ds.sizes[dim] < len(times):
+            logger.info(
+                f"{group}: skipping {len(times) - ds.sizes[dim]} observations "
+                f"up to {coverage[1]} already in store"
+            )
+        if ds.sizes[dim] == 0:
+            return 0
+
+    ds = ds.copy()
+    for var in ds.variables.values():
+        # netcdf storage settings do not apply to zarr
+        var.encoding = {
+            k: v
+            for k, v in var.encoding.items()
+            if k in ["units", "calendar", "dtype", "_FillValue"]
+        }
+
+    if coverage:
+        existing = xr.open_zarr(store, group=group, consolidated=True)
+        chunk_size = existing[name].encoding["chunks"][0]
+        remainder = -existing.sizes[dim] % chunk_size
+        size = ds.sizes[dim]
+        head = [min(remainder, size)] if remainder else []
+        body = size - sum(head)
+        chunks = head + [chunk_size] * (body // chunk_size)
+        if body % chunk_size:
+            chunks.append(body % chunk_size)
+        ds.chunk({dim: tuple(chunks)}).to_zarr(
+            store, group=group, append_dim=dim, consolidated=True
+        )
+    else:
+        chunk_size = auto_chunks(ds, target_bytes=chunk_bytes, dims=(dim,))
+        ds.chunk(chunk_size or {dim: -1}).to_zarr(
+            store, group=group, mode="w", consolidated=True
+        )
+    return ds.sizes[dim]
+
+
 def instrument_to_query(
     ooi_url="",
     site_rd="",
@@ -262,105 +884,404 @@ def instrument_to_query(
     return (data_url, payload)
 
 
-def download_raw_file(source_folder, ref, raw):
+def fetch_json_pages(
+    data_url,
+    params,
+    auth=None,
+    session=None,
+    windows=1,
+    max_workers=5,
+    min_window=datetime.timedelta(seconds=1),
+):
     """
+    Fetch a json M2M request by walking its time range in windows
+    that stay under the data points limit.
+
+    A window returning as many points as the limit is split in half and
+    refetched, so every page holds the full resolution data.
+
     Args:
+        data_url (str): M2M data url of the instrument stream.
+        params (dict): Request parameters from ``instrument_to_query``.
+        auth (tuple, optional): M2M username and token.
+        session (requests.Session, optional): Session to fetch pages with.
+        windows (int, optional): Number of windows to start with.
+        max_workers (int, optional): Maximum number of pages fetched concurrently.
+        min_window (datetime.timedelta, optional): Smallest window to split.
+
+    Returns:
+        pandas.DataFrame: Data points of all pages, sorted by time.
+
+    Raises:
+        requests.exceptions.HTTPError: When a page request fails.
+        ValueError: When a page returns an error instead of data points.
+    """
+    session = session or requests.Session()
+    limit = params["limit"]
+    begin_dt = parser.parse(params["beginDT"])
+    end_dt = parser.parse(params["endDT"])
+
+    def fetch_page(window):
+        page_params = dict(
+            params,
+            beginDT=datetime_to_string(window[0]),
+            endDT=datetime_to_string(window[1]),
+        )
+        r = fetch_url(
+            requests.Request(
+                "GET", data_url, auth=auth, params=page_params
+            ).prepare(),
+            session=session,
+        )
+        if r.status_code != 200:
+            raise requests.exceptions.HTTPError(
+                f"Page {r.url} failed: {r.status_code}, {r.reason}",
+                response=r,
+            )
+        records = r.json()
+        if not isinstance(records, list):
+            raise ValueError(f"Page {r.url} failed: {records}")
+        return records
+
+    pages = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {
+            executor.submit(fetch_page, window): window
+            for window in split_time_range(begin_dt, end_dt, windows)
+        }
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                window = pending.pop(future)
+                try:
+                    records = future.result()
+                except Exception:
+                    # A missing window would leave a gap in the data
+                    for other in pending:
+                        other.cancel()
+                    raise
+                if (
+                    len(records) >= limit
+                    and window[1] - window[0] > min_window
+                ):
+                    logger.debug(f"Splitting saturated window {window}")
+                    for half in split_time_range(*window, windows=2):
+                        pending[executor.submit(fetch_page, half)] = half
+                else:
+                    pages.append(records)
+
+    datadf = pd.DataFrame.from_records(
+        [record for records in pages for record in records]
+    )
+    if "time" in datadf.columns:
+        datadf = datadf.drop_duplicates(subset=["time"]).sort_values(
+            by="time"
+        )
+    return datadf.reset_index(drop=True)
+
+
+def download_raw_file(
+    source_folder,
+    ref,
+    raw,
+    session=None,
+    retries=5,
+    buffer_size=DOWNLOAD_BUFFER_SIZE,
+):
+    """
+    Download a raw EK60 file, resuming a partial download.
+
+    Args:
+        source_folder (str): Folder holding one folder per reference.
         ref (str): String. Reference to site and platform.
         raw (Series): Pandas Series. Information containing raw url and filename
+        session (requests.Session, optional): Session to download with.
+        retries (int, optional): Maximum number of download attempts.
+        buffer_size (int, optional): Download buffer size in bytes.
+
+    Returns:
+        str: Raw file path, None if the download failed.
     """
 
     temp_folder = os.path.join(source_folder, ref)
-    if not os.path.exists(temp_folder):
-        os.mkdir(temp_folder)
+    os.makedirs(temp_folder, exist_ok=True)
 
     temp_file = os.path.join(temp_folder, raw["filename"])
-    print(
-        f"{datetime.datetime.now().strftime('%H:%M:%S')}  downloading: {os.path.basename(temp_file)}"
-    )
+    # Downloads are only renamed from .part once complete
     if os.path.exists(temp_file):
-        print("          ... this file already exists, skipping download.")
+        logger.info(f"{raw['filename']} already exists, skipping download.")
         return temp_file
-    else:
-        r = requests.get(raw["urls"], allow_redirects=True)
-        if r.status_code == 200:
-            with open(temp_file, mode="wb") as rawfile:
-                rawfile.write(r.content)
-            return temp_file
-        else:
-            print(r.status_code)
-            return None
 
+    start = time.perf_counter()
+    fname = download_url(
+        raw["urls"],
+        temp_folder,
+        session or requests.Session(),
+        retries=retries,
+        buffer_size=buffer_size,
+        validate=None,
+    )
+    if not fname:
+        return None
+    elapsed = time.perf_counter() - start
+    size = os.path.getsize(temp_file)
+    logger.info(
+        f"{fname}: {size / 1024 ** 2:.1f} MiB in {elapsed:.1f}s "
+        f"({size / 1024 ** 2 / max(elapsed, 1e-6):.1f} MiB/s)"
+    )
+    return temp_file
 
-def get_processed_ek60(temp_file, clean_up=True):
+
+def get_processed_ek60(temp_file, clean_up=True, params=None, in_memory=True):
+    """
+    Process a raw EK60 file into a MVBS netcdf.
+
+    The raw file is converted to netcdf first, as ``EchoData`` reads
+    converted files. With ``in_memory``, the calibrated and denoised Sv are
+    then kept in memory and only the MVBS product is written, instead of
+    writing and rereading ``_Sv.nc`` and ``_Sv_clean.nc``.
+
+    Args:
+        temp_file (str): Raw file path.
+        clean_up (bool, optional): Remove the intermediate netcdfs.
+        params (dict, optional): Keyword arguments per processing step,
+            e.g. ``{"get_MVBS": {"MVBS_ping_size": 30}}``.
+        in_memory (bool, optional): Keep the intermediate Sv in memory.
+
+    Returns:
+        str: MVBS netcdf path.
+    """
+    params = params or {}
+    converted = temp_file.replace(".raw", ".nc")
     calibrated = temp_file.replace(".raw", "_Sv.nc")
     calibrated_cleaned = temp_file.replace(".raw", "_Sv_clean.nc")
     mvbs = temp_file.replace(".raw", "_MVBS.nc")
 
+    for path in [calibrated, calibrated_cleaned, mvbs]:
+        if os.path.exists(path):
+            os.unlink(path)
+
     data_tmp = ConvertEK60(temp_file)
     data_tmp.raw2nc()
 
-    data = EchoData(temp_file.replace(".raw", ".nc"))
+    data = EchoData(converted)
 
     # Calibration and echo-integration
-    if os.path.exists(calibrated):
-        os.unlink(calibrated)
-    data.calibrate(save=True)
+    data.calibrate(save=not in_memory, **params.get("calibrate", {}))
 
-    # Denoising
-    if os.path.exists(calibrated_cleaned):
-        os.unlink(calibrated_cleaned)
-    data.remove_noise(save=True)
+    # Denoising, from the in memory Sv unless it was saved
+    data.remove_noise(save=not in_memory, **params.get("remove_noise", {}))
 
     # Mean Volume Backscatter Strength
-    if os.path.exists(mvbs):
-        os.unlink(mvbs)
-    data.get_MVBS(save=True)
+    data.get_MVBS(save=True, **params.get("get_MVBS", {}))
 
     if os.path.exists(mvbs):
         if clean_up:
-            print(
-                f"{datetime.datetime.now().strftime('%H:%M:%S')}  cleaning up: {temp_file.replace('.raw', '.nc')}"
-            )
-            os.unlink(temp_file.replace(".raw", ".nc"))
-            print(
-                f"{datetime.datetime.now().strftime('%H:%M:%S')}  cleaning up: {temp_file.replace('.raw', '_Sv.nc')}"
-            )
-            os.unlink(temp_file.replace(".raw", "_Sv.nc"))
-            print(
-                f"{datetime.datetime.now().strftime('%H:%M:%S')}  cleaning up: {temp_file.replace('.raw', '_Sv_clean.nc')}"
-            )
-            os.unlink(temp_file.replace(".raw", "_Sv_clean.nc"))
+            for path in [converted, calibrated, calibrated_cleaned]:
+                if os.path.exists(path):
+                    print(
+                        f"{datetime.datetime.now().strftime('%H:%M:%S')}  cleaning up: {path}"
+                    )
+                    os.unlink(path)
         return mvbs
 
 
-def perform_ek60_download(filtered_datadf, source_name="ooi", timeout=3600):
-    raw_files = {}
-    for ref, raw_df in filtered_datadf.items():
-        raw_files[ref] = []
-        source_folder = create_folder(source_name)
-        if os.path.exists(source_folder):
-            jobs = [
-                gevent.spawn(download_raw_file, source_folder, ref, raw)
-                for idx, raw in raw_df.iterrows()
-            ]
-            gevent.joinall(jobs, timeout=timeout)
-            for job in jobs:
-                raw_files[ref].append(job.value)
+def perform_ek60_download(
+    filtered_datadf,
+    source_name="ooi",
+    timeout=3600,
+    max_workers=MAX_WORKERS,
+    session=None,
+):
+    """
+    Download the raw EK60 files of every reference concurrently.
+
+    Args:
+        filtered_datadf (dict): Raw file listing dataframe per reference,
+            with ``filename`` and ``urls`` columns.
+        source_name (str, optional): Data source name.
+        timeout (int, optional): Seconds to wait for all downloads to finish.
+        max_workers (int, optional): Maximum number of concurrent downloads, for all references.
+        session (requests.Session, optional): Session to download with.
+
+    Returns:
+        dict: Raw file paths per reference, None for failed downloads.
+    """
+    raw_files = {ref: [] for ref in filtered_datadf}
+    source_folder = create_folder(source_name)
+    if not source_folder or not os.path.exists(source_folder):
+        return raw_files
+
+    if session is None:
+        # Keep a pooled connection for every download
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=max_workers, pool_maxsize=max_workers
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+    jobs = [
+        (ref, raw)
+        for ref, raw_df in filtered_datadf.items()
+        for idx, raw in raw_df.iterrows()
+    ]
+    existing = {
+        os.path.join(source_folder, ref, raw["filename"])
+        for ref, raw in jobs
+        if os.path.exists(os.path.join(source_folder, ref, raw["filename"]))
+    }
+    start = time.perf_counter()
+    results = run_concurrently(
+        download_raw_file,
+        [(source_folder, ref, raw, session) for ref, raw in jobs],
+        max_workers=max_workers,
+        timeout=timeout,
+    )
+    elapsed = time.perf_counter() - start
+
+    for (ref, raw), raw_file in zip(jobs, results):
+        raw_files[ref].append(raw_file)
+    downloaded = [f for f in results if f and f not in existing]
+    size = sum(os.path.getsize(raw_file) for raw_file in downloaded)
+    logger.info(
+        f"Downloaded {len(downloaded)} raw files "
+        f"({len(existing)} already present, "
+        f"{len(jobs) - len(downloaded) - len(existing)} failed), "
+        f"{size / 1024 ** 2:.1f} MiB in {elapsed:.1f}s "
+        f"({size / 1024 ** 2 / max(elapsed, 1e-6):.1f} MiB/s)"
+    )
     return raw_files
 
 
-def perform_ek60_processing(raw_file_dict, timeout=3600, clean_up=True):
-    mvbs_files = {}
+def ek60_processing_key(raw_file, params=None, sample_size=1024 * 1024):
+    """
+    Identify the processing of a raw EK60 file by the file name, size,
+    a digest of its first and last ``sample_size`` bytes, the processing
+    parameters and the echopype version.
+
+    Returns:
+        str: Hex digest of the processing.
+    """
+    size = os.path.getsize(raw_file)
+    digest = hashlib.sha1()
+    with open(raw_file, "rb") as f:
+        digest.update(f.read(sample_size))
+        if size > sample_size:
+            f.seek(max(size - sample_size, sample_size))
+            digest.update(f.read())
+    identity = json.dumps(
+        {
+            "name": os.path.basename(raw_file),
+            "size": size,
+            "sample": digest.hexdigest(),
+            "params": params or {},
+            "echopype": getattr(echopype, "__version__", None),
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha1(identity.encode()).hexdigest()
+
+
+def perform_ek60_processing(
+    raw_file_dict,
+    timeout=3600,
+    clean_up=True,
+    max_workers=None,
+    params=None,
+    cache=None,
+    in_memory=True,
+):
+    """
+    Process raw EK60 files into MVBS netcdfs on a process pool.
+
+    Files of every reference share one pool. A file that fails to process
+    is logged and left out, without affecting the other files. With a
+    cache, files already processed with the same parameters are taken from
+    it instead, copied next to their raw file, and new MVBS netcdfs are
+    added to it.
+
+    Args:
+        raw_file_dict (dict): Raw file paths per reference.
+        timeout (int, optional): Seconds to wait for all files to be processed.
+        clean_up (bool, optional): Remove the intermediate netcdfs.
+        max_workers (int, optional): Number of processes. Defaults to the number of cores.
+        params (dict, optional): Keyword arguments per processing step, see ``get_processed_ek60``.
+        cache (yodapy.utils.cache.DataCache, optional): Cache of MVBS netcdfs.
+        in_memory (bool, optional): Keep the intermediate Sv in memory, see ``get_processed_ek60``.
+
+    Returns:
+        dict: MVBS netcdf paths per reference, in the order of the raw files.
+    """
+    processed = {}
+    jobs = []
     for ref, raw_files in raw_file_dict.items():
-        mvbs_files[ref] = []
-        jobs = [
-            gevent.spawn(get_processed_ek60, raw, clean_up)
-            for raw in raw_files
-        ]
-        gevent.joinall(jobs, timeout=timeout)
-        for job in jobs:
-            mvbs_files[ref].append(job.value)
+        for raw in filter(None, raw_files):
+            cache_url = None
+            if cache is not None:
+                key = ek60_processing_key(raw, params)
+                mvbs = raw.replace(".raw", "_MVBS.nc")
+                cache_url = f"ek60://{ref}/{key}/{os.path.basename(mvbs)}"
+                # Replaces a MVBS netcdf processed with other parameters
+                if cache.export(
+                    cache_url, os.path.dirname(raw) or ".", overwrite=True
+                ):
+                    logger.info(f"{os.path.basename(raw)} MVBS found in cache.")
+                    processed[raw] = mvbs
+                    continue
+            jobs.append((raw, cache_url))
+
+    # CPU bound, so one process per core by default
+    results = run_concurrently(
+        get_processed_ek60,
+        [(raw, clean_up, params, in_memory) for raw, _ in jobs],
+        max_workers=max_workers or os.cpu_count(),
+        timeout=timeout,
+        processes=True,
+    )
+    for (raw, cache_url), mvbs in zip(jobs, results):
+        processed[raw] = mvbs
+        if mvbs and cache_url:
+            cache.put(cache_url, mvbs)
+    if cache is not None:
+        cache.flush()
+
+    mvbs_files = {ref: [] for ref in raw_file_dict}
+    for ref, raw_files in raw_file_dict.items():
+        for raw in filter(None, raw_files):
+            if processed.get(raw):
+                mvbs_files[ref].append(processed[raw])
+            else:
+                logger.warning(f"{ref}: skipping {os.path.basename(raw)}")
     return mvbs_files
 
 
+class EK60Processing:
+    """Deferred ``perform_ek60_processing`` of raw EK60 files.
+
+    The raw files of every reference are processed together, on one
+    process pool, the first time the MVBS files of any reference are
+    requested.
+
+    Args:
+        raw_file_dict (dict): Raw file paths per reference.
+        **kwargs: Keyword arguments for ``perform_ek60_processing``.
+    """
+
+    def __init__(self, raw_file_dict, **kwargs):
+        self._raw_file_dict = raw_file_dict
+        self._kwargs = kwargs
+        self._lock = threading.Lock()
+        self._mvbs_files = None
+
+    def get(self, ref):
+        """ MVBS netcdf paths of a reference, processing every raw file on first call """
+        with self._lock:
+            if self._mvbs_files is None:
+                self._mvbs_files = perform_ek60_processing(
+                    self._raw_file_dict, **self._kwargs
+                )
+        return self._mvbs_files.get(ref, [])
+
+
 # --- End OOI Data Source Specific connection methods ---
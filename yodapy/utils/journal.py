@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (
+    absolute_import,
+    division,
+    print_function,
+    unicode_literals,
+)
+
+import datetime
+import json
+import logging
+import os
+import threading
+
+from yodapy.utils.meta import create_folder
+
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_FILE = "journal.json"
+# Days a fully downloaded job is kept in the journal
+JOURNAL_MAX_AGE = 7
+
+
+class RequestJournal:
+    """Durable journal of submitted data requests.
+
+    Each M2M job is keyed by its request url and keeps the M2M response,
+    its status url, status and the files downloaded so far. The journal is
+    saved to ``~/.yodapy/<source>/journal.json`` after every change, so a
+    restarted process can pick the jobs back up instead of resubmitting.
+    Fully downloaded jobs are pruned once older than ``max_age`` days.
+
+    Args:
+        source_name (str): Data source name.
+        max_age (int, optional): Days a downloaded job is kept.
+    """
+
+    def __init__(self, source_name="ooi", max_age=JOURNAL_MAX_AGE):
+        self._lock = threading.Lock()
+        self._path = None
+        self._jobs = {}
+        self.max_age = max_age
+
+        folder = create_folder(source_name)
+        if folder:
+            self._path = os.path.join(folder, JOURNAL_FILE)
+            self._jobs = self._load()
+            self.prune()
+
+    def __len__(self):
+        return len(self._jobs)
+
+    @property
+    def jobs(self):
+        """ Journal entries keyed by M2M request url """
+        return self._jobs
+
+    def get(self, m2m_url):
+        """ Return the journal entry of a M2M request url """
+        return self._jobs.get(m2m_url)
+
+    def find(self, status_url):
+        """ Return the journal entry of a status url """
+        for job in self._jobs.values():
+            if job["status_url"] == status_url:
+                return job
+        return None
+
+    def pending(self):
+        """ Return the jobs that are not fully downloaded yet """
+        return [
+            job
+            for job in self._jobs.values()
+            if job["status"] in ["submitted", "completed"]
+        ]
+
+    def record(self, m2m_url, response):
+        """ Record a submitted M2M request and its response """
+        with self._lock:
+            self._jobs[m2m_url] = {
+                "m2m_url": m2m_url,
+                "response": response,
+                "status_url": response["allURLs"][1],
+                "thredds_url": response["allURLs"][0],
+                "status": "submitted",
+                "submitted": datetime.datetime.utcnow().isoformat(),
+                "downloaded": [],
+            }
+            self._save()
+
+    def set_status(self, status_url, status):
+        """ Set the status of the job with status url """
+        with self._lock:
+            job = self.find(status_url)
+            if job and job["status"] != status:
+                job["status"] = status
+                self._save()
+
+    def add_download(self, status_url, fname):
+        """ Record a finished download of the job with status url """
+        with self._lock:
+            job = self.find(status_url)
+            if job and fname not in job["downloaded"]:
+                job["downloaded"].append(fname)
+                self._save()
+
+    def remove(self, m2m_url):
+        """ Remove a job from the journal """
+        with self._lock:
+            if self._jobs.pop(m2m_url, None):
+                self._save()
+
+    def prune(self):
+        """ Remove the downloaded jobs submitted more than ``max_age`` days ago """
+        oldest = datetime.datetime.utcnow() - datetime.timedelta(
+            days=self.max_age
+        )
+        with self._lock:
+            expired = [
+                m2m_url
+                for m2m_url, job in self._jobs.items()
+                if job["status"] == "downloaded"
+                and datetime.datetime.fromisoformat(job["submitted"]) < oldest
+            ]
+            for m2m_url in expired:
+                del self._jobs[m2m_url]
+            if expired:
+                self._save()
+        return len(expired)
+
+    def clear(self):
+        """ Remove all jobs from the journal """
+        with self._lock:
+            self._jobs = {}
+            self._save()
+
+    def _load(self):
+        if not os.path.exists(self._path):
+            return {}
+        try:
+            with open(self._path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Unable to read request journal {self._path}: {e}")
+            return {}
+
+    def _save(self):
+        if not self._path:
+            return
+        temp_path = f"{self._path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self._jobs, f)
+        os.replace(temp_path, self._path)
@@ -41,6 +41,8 @@ def delete_all_cache(source_name):
             if len(os.listdir(fold_path)) > 0:
                 for folder in os.listdir(fold_path):
                     cache_path = os.path.join(fold_path, folder)
+                    if not os.path.isdir(cache_path):
+                        continue
                     file_count = len(os.listdir(cache_path))
                     print(f"deleting {file_count} files from {cache_path}")
                     try:
@@ -8,7 +8,13 @@ from __future__ import (
 )
 
 import datetime
+import hashlib
+import json
 import logging
+import os
+import re
+import threading
+import time
 
 import netCDF4 as nc
 import numpy as np
@@ -21,6 +27,16 @@ from siphon.catalog import TDSCatalog
 
 logger = logging.getLogger(__name__)
 
+# Default target size of a dask chunk, in bytes
+CHUNK_BYTES = 64 * 1024 * 1024
+
+# Seconds a parsed THREDDS catalog is reused
+THREDDS_CATALOG_TTL = 3600
+
+# Parsed THREDDS catalogs and parse time keyed by catalog url
+_thredds_catalogs = {}
+_thredds_lock = threading.Lock()
+
 
 def unix_time_millis(dt):
     epoch = datetime.datetime.utcfromtimestamp(0).replace(tzinfo=pytz.UTC)
@@ -48,6 +64,14 @@ def get_midnight(dt):
     return nextday.replace(**dict(zip(time_labels, zeroed)))
 
 
+def split_time_range(begin_dt, end_dt, windows=1):
+    """ Split a time range into contiguous, equally sized windows """
+    windows = max(int(windows), 1)
+    step = (end_dt - begin_dt) / windows
+    edges = [begin_dt + step * i for i in range(windows)] + [end_dt]
+    return list(zip(edges[:-1], edges[1:]))
+
+
 def build_url(*args):
     return "/".join(args)
 
@@ -83,13 +107,205 @@ def obs_index(ds):
     return indexdf[["time", "sel_range"]].dropna()
 
 
+def auto_chunks(ds, target_bytes=CHUNK_BYTES, dims=("obs", "time")):
+    """
+    Chunk the observation dimension of a dataset into chunks of about
+    target_bytes for its widest variable.
+
+    Args:
+        ds (xarray.Dataset): Dataset, only its metadata is read.
+        target_bytes (int, optional): Target chunk size in bytes.
+        dims (tuple, optional): Candidate observation dimensions, first found is used.
+
+    Returns:
+        dict: Chunks for ``xarray.open_mfdataset``, empty when no dimension is found.
+    """
+    dim = next((d for d in dims if d in ds.dims), None)
+    if dim is None:
+        return {}
+
+    row_bytes = max(
+        var.dtype.itemsize
+        * int(np.prod([ds.sizes[d] for d in var.dims if d != dim]))
+        for var in ds.variables.values()
+        if dim in var.dims
+    )
+    rows = max(1, target_bytes // row_bytes)
+    return {dim: int(min(rows, ds.sizes[dim]))}
+
+
+def variable_drops(ds, variables, keep=("time", "lat", "lon", "depth")):
+    """
+    Names of the variables of a dataset that are not needed to read
+    the given variables and their coordinates.
+
+    Args:
+        ds (xarray.Dataset): Dataset, only its metadata is read.
+        variables (list): Variables to read.
+        keep (tuple, optional): Coordinate variables to always read.
+
+    Returns:
+        list: Variable names for ``drop_variables``.
+    """
+    found = [name for name in variables if name in ds.variables]
+    if not found:
+        logger.warning(f"Variables {variables} not found, reading all.")
+        return []
+
+    needed = set(found) | set(keep) | set(ds.dims)
+    for name in found:
+        needed.update(ds[name].attrs.get("coordinates", "").split())
+    return [name for name in ds.variables if name not in needed]
+
+
+def naive_datetime(dt_str):
+    """ Parse a date string to a naive UTC datetime, None stays None """
+    if not dt_str:
+        return None
+    dt = parser.parse(dt_str)
+    if dt.tzinfo:
+        dt = dt.astimezone(pytz.UTC).replace(tzinfo=None)
+    return dt
+
+
+def file_time_coverage(name):
+    """
+    Parse the time coverage of an OOI netcdf from its name, e.g.
+    ``..._20180101T000000.596438-20180131T235959.815406.nc``.
+
+    Returns:
+        tuple: Begin and end datetime, None when the name has no coverage.
+    """
+    match = re.search(
+        r"(\d{8}T\d{6})(?:\.\d+)?-(\d{8}T\d{6})(?:\.\d+)?\.nc", name
+    )
+    if not match:
+        return None
+    return tuple(
+        datetime.datetime.strptime(dt, "%Y%m%dT%H%M%S")
+        for dt in match.groups()
+    )
+
+
+def filter_time_coverage(urls, begin_dt=None, end_dt=None):
+    """ Keep the netcdf urls whose time coverage overlaps begin_dt to end_dt """
+    filtered = []
+    for url in urls:
+        coverage = file_time_coverage(url.split("#")[0])
+        if coverage:
+            if begin_dt and coverage[1] < begin_dt.replace(microsecond=0):
+                continue
+            if end_dt and coverage[0] > end_dt:
+                continue
+        filtered.append(url)
+    return filtered
+
+
+def time_slicer(begin_dt=None, end_dt=None, preprocess=None):
+    """
+    Create an ``open_mfdataset`` preprocess function that slices each file
+    to begin_dt - end_dt by index along the time dimension, so only the
+    time variable is read before slicing.
+    """
+
+    def slice_time(ds):
+        times = ds["time"].values
+        start = 0
+        stop = len(times)
+        if begin_dt:
+            start = np.searchsorted(times, np.datetime64(begin_dt), "left")
+        if end_dt:
+            stop = np.searchsorted(times, np.datetime64(end_dt), "right")
+        ds = ds.isel({ds["time"].dims[0]: slice(start, stop)})
+        if preprocess:
+            return preprocess(ds)
+        return ds
+
+    return slice_time
+
+
+def get_thredds_catalog(caturl, cache_dir=None, ttl=THREDDS_CATALOG_TTL):
+    """
+    Fetch and parse a THREDDS catalog, reusing it for ``ttl`` seconds.
+
+    Catalogs of requests that are still being filled change, so parsed
+    catalogs expire, in memory and on disk, and empty catalogs are not kept.
+
+    Args:
+        caturl (str): THREDDS catalog xml url.
+        cache_dir (str, optional): Folder to persist the parsed catalog in, keyed by catalog url.
+        ttl (int, optional): Seconds a parsed catalog is reused, 0 to always fetch.
+
+    Returns:
+        list: Catalog datasets as dictionaries of ``name`` and ``access_urls``.
+    """
+    with _thredds_lock:
+        if caturl in _thredds_catalogs:
+            parsed_at, datasets = _thredds_catalogs[caturl]
+            if time.time() - parsed_at < ttl:
+                return datasets
+            del _thredds_catalogs[caturl]
+
+    cache_file = None
+    if cache_dir:
+        cache_file = os.path.join(
+            cache_dir, f"{hashlib.sha1(caturl.encode()).hexdigest()}.json"
+        )
+
+    parsed_at = time.time()
+    if (
+        cache_file
+        and os.path.exists(cache_file)
+        and parsed_at - os.path.getmtime(cache_file) < ttl
+    ):
+        parsed_at = os.path.getmtime(cache_file)
+        with open(cache_file) as f:
+            datasets = json.load(f)
+    else:
+        cat = TDSCatalog(caturl)
+        datasets = [
+            {"name": d.name, "access_urls": dict(d.access_urls)}
+            for d in cat.datasets.values()
+        ]
+        if not datasets:
+            return datasets
+        if cache_file:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(f"{cache_file}.tmp", "w") as f:
+                json.dump(datasets, f)
+            os.replace(f"{cache_file}.tmp", cache_file)
+
+    with _thredds_lock:
+        _thredds_catalogs[caturl] = (parsed_at, datasets)
+    return datasets
+
+
+def clear_thredds_catalogs():
+    """ Forget the THREDDS catalogs parsed in this process """
+    with _thredds_lock:
+        _thredds_catalogs.clear()
+
+
+def filter_time_range(datasets, begin_dt, end_dt, regex):
+    """ Filter catalog datasets by the date in their name """
+    filtered = []
+    for d in datasets:
+        match = re.search(regex, d["name"])
+        if match:
+            dt = datetime.datetime(
+                **{k: int(v) for k, v in match.groupdict().items()}
+            )
+            if begin_dt <= dt <= end_dt:
+                filtered.append(d)
+    return filtered
+
+
 def get_nc_urls(thredds_url, download=False, cloud_source=False, **kwargs):
     urltype = "OPENDAP"
     if download:
         urltype = "HTTPServer"
     caturl = thredds_url.replace(".html", ".xml")
-    cat = TDSCatalog(caturl)
-    datasets = cat.datasets
+    datasets = get_thredds_catalog(caturl, cache_dir=kwargs.get("cache_dir"))
     dataset_urls = []
     if cloud_source:
         strbd = kwargs.get("begin_date")
@@ -99,8 +315,9 @@ def get_nc_urls(thredds_url, download=False, cloud_source=False, **kwargs):
         ed = parser.parse(stred)
         dataset_urls = list(
             map(
-                lambda x: x.access_urls[urltype],
-                datasets.filter_time_range(
+                lambda x: x["access_urls"][urltype],
+                filter_time_range(
+                    datasets,
                     bd,
                     ed,
                     regex=r"(?P<year>\d{4})(?P<month>[01]\d)(?P<day>[0123]\d)",
@@ -115,18 +332,18 @@ def get_nc_urls(thredds_url, download=False, cloud_source=False, **kwargs):
         ncfiles = list(
             filter(
                 lambda d: not any(
-                    w in d.name for w in ["json", "txt", "ncml"]
+                    w in d["name"] for w in ["json", "txt", "ncml"]
                 ),  # noqa
-                [cat.datasets[i] for i, d in enumerate(datasets)],
+                datasets,
             )
         )  # noqa
 
         # Note: `#fillmismatch` addition to dataset netcdf url is currently a workaround.
         # This needs to be fixed in the data provider end.
         dataset_urls = [
-            f"{d.access_urls[urltype]}#fillmismatch"
+            f"{d['access_urls'][urltype]}#fillmismatch"
             if urltype == "OPENDAP"  # noqa
-            else d.access_urls[urltype]
+            else d["access_urls"][urltype]
             for d in ncfiles
         ]
 